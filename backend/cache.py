@@ -0,0 +1,103 @@
+import hashlib
+import json
+import sqlite3
+import threading
+from datetime import datetime
+
+import numpy as np
+
+CACHE_PATH = 'cache.db'
+
+# stay under SQLite's limit on bound parameters per statement
+MAX_SQL_VARIABLES = 500
+
+
+def content_hash(*parts: str) -> str:
+    hasher = hashlib.sha256()
+    for part in parts:
+        hasher.update(part.encode('utf-8'))
+        hasher.update(b'\0')
+    return hasher.hexdigest()
+
+
+class SummaryCache:
+    """Persistent cache of LLM place summaries keyed by a hash of the model and prompt"""
+
+    def __init__(self, db_path: str = CACHE_PATH):
+        self.conn = sqlite3.connect(db_path)
+        self.conn.execute("""
+            CREATE TABLE IF NOT EXISTS SummaryCache (
+                key TEXT PRIMARY KEY,
+                model TEXT,
+                summary_json TEXT,
+                created_at TEXT
+            )
+        """)
+        self.conn.commit()
+
+    @staticmethod
+    def make_key(model: str, prompt: str) -> str:
+        # the prompt embeds every place field the summary depends on
+        return content_hash(model, prompt)
+
+    def get_many(self, keys: list[str]) -> dict[str, dict]:
+        found = {}
+        for start in range(0, len(keys), MAX_SQL_VARIABLES):
+            chunk = keys[start:start + MAX_SQL_VARIABLES]
+            placeholders = ','.join(['?' for _ in chunk])
+            rows = self.conn.execute(
+                f"SELECT key, summary_json FROM SummaryCache WHERE key IN ({placeholders})", chunk)
+            for key, summary_json in rows:
+                found[key] = json.loads(summary_json)
+        return found
+
+    def put_many(self, model: str, summaries: dict[str, dict]):
+        created_at = datetime.now().isoformat()
+        self.conn.executemany(
+            "INSERT OR REPLACE INTO SummaryCache (key, model, summary_json, created_at) VALUES (?, ?, ?, ?)",
+            [(key, model, json.dumps(summary), created_at) for key, summary in summaries.items()])
+        self.conn.commit()
+
+
+class EmbeddingCache:
+    """Persistent cache of embedding vectors keyed by (model, text hash)"""
+
+    def __init__(self, db_path: str = CACHE_PATH):
+        # queries embed from FastAPI/LangGraph worker threads, so share one connection behind a lock
+        self.conn = sqlite3.connect(db_path, check_same_thread=False)
+        self.lock = threading.Lock()
+        with self.lock:
+            self.conn.execute("PRAGMA journal_mode=WAL")
+            self.conn.execute("""
+                CREATE TABLE IF NOT EXISTS EmbeddingCache (
+                    model TEXT,
+                    key TEXT,
+                    embedding BLOB,
+                    PRIMARY KEY(model, key)
+                ) WITHOUT ROWID
+            """)
+            self.conn.commit()
+
+    @staticmethod
+    def make_key(text: str) -> str:
+        return content_hash(text)
+
+    def get_many(self, model: str, keys: list[str]) -> dict[str, np.ndarray]:
+        found = {}
+        with self.lock:
+            for start in range(0, len(keys), MAX_SQL_VARIABLES):
+                chunk = keys[start:start + MAX_SQL_VARIABLES]
+                placeholders = ','.join(['?' for _ in chunk])
+                rows = self.conn.execute(
+                    f"SELECT key, embedding FROM EmbeddingCache WHERE model = ? AND key IN ({placeholders})",
+                    [model] + chunk).fetchall()
+                for key, embedding in rows:
+                    found[key] = np.frombuffer(embedding, dtype=np.float32)
+        return found
+
+    def put_many(self, model: str, embeddings: dict[str, np.ndarray]):
+        with self.lock:
+            self.conn.executemany(
+                "INSERT OR REPLACE INTO EmbeddingCache (model, key, embedding) VALUES (?, ?, ?)",
+                [(model, key, np.asarray(embedding, dtype=np.float32).tobytes()) for key, embedding in embeddings.items()])
+            self.conn.commit()
@@ -0,0 +1,23 @@
+import argparse
+import os
+import sys
+
+from indexer import SQLiteStore
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Fail if any hot search query is planned to scan a table instead of searching an index')
+    parser.add_argument('--db-path', default=os.getenv('DB_PATH', 'places.db'))
+    args = parser.parse_args()
+
+    store = SQLiteStore(args.db_path)
+    regressions = store.check_query_plans()
+    for name, scans in regressions.items():
+        print(f'{name}: {", ".join(scans)}')
+    print(f'Schema version {store.schema_version}: '
+          f'{len(regressions)} of {len(store.hot_queries())} hot queries scan a table')
+    sys.exit(1 if regressions else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,76 @@
+import os
+import sqlite3
+import threading
+from urllib.request import pathname2url
+
+# reads are served from the OS page cache through the memory map instead of read() copies
+DEFAULT_MMAP_SIZE = 256 * 1024 * 1024
+DEFAULT_CACHE_SIZE_KIB = 64 * 1024
+
+
+class ReadConnectionPool:
+    """Read-only SQLite connections for the search tools, one per thread.
+
+    sqlite3 connections can't be shared across threads safely, and one shared connection serializes every
+    query. Giving each worker thread its own connection lets concurrent tool calls read in parallel.
+
+    With in_memory=True the database is copied into memory through the backup API on first use, and each
+    thread reads its own copy of that snapshot. Reads never touch the disk, but they don't see later writes
+    to the file either, so only use it for a server that doesn't index while running.
+    """
+
+    def __init__(self, db_path: str, in_memory: bool = False, mmap_size: int = DEFAULT_MMAP_SIZE,
+                 cache_size_kib: int = DEFAULT_CACHE_SIZE_KIB):
+        self.uri = f"file:{pathname2url(os.path.abspath(db_path))}?mode=ro"
+        self.in_memory = in_memory
+        self.mmap_size = mmap_size
+        self.cache_size_kib = cache_size_kib
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._connections = []
+        self._snapshot = None
+
+    def _load_snapshot(self) -> sqlite3.Connection:
+        # taken lazily so the copy includes any migrations run after the pool was created
+        with self._lock:
+            if self._snapshot is None:
+                source = sqlite3.connect(self.uri, uri=True)
+                snapshot = sqlite3.connect(':memory:', check_same_thread=False)
+                source.backup(snapshot)
+                source.close()
+                self._snapshot = snapshot
+            return self._snapshot
+
+    def _connect(self) -> sqlite3.Connection:
+        if self.in_memory:
+            snapshot = self._load_snapshot()
+            conn = sqlite3.connect(':memory:', check_same_thread=False)
+            with self._lock:
+                snapshot.backup(conn)
+        else:
+            conn = sqlite3.connect(self.uri, uri=True, check_same_thread=False)
+            conn.execute(f"PRAGMA mmap_size={int(self.mmap_size)}")
+
+        conn.execute(f"PRAGMA cache_size=-{int(self.cache_size_kib)}")
+        conn.execute("PRAGMA temp_store=MEMORY")
+        conn.execute("PRAGMA query_only=ON")
+        return conn
+
+    def connection(self) -> sqlite3.Connection:
+        """The calling thread's connection, opened on its first call"""
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = self._local.conn = self._connect()
+            with self._lock:
+                self._connections.append(conn)
+        return conn
+
+    def close(self):
+        with self._lock:
+            for conn in self._connections:
+                conn.close()
+            self._connections.clear()
+            if self._snapshot is not None:
+                self._snapshot.close()
+                self._snapshot = None
+        self._local = threading.local()
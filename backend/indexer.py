@@ -1,21 +1,107 @@
+import asyncio
+import math
+import re
 import sqlite3
+import threading
 import chromadb
+import numpy as np
 from model import Place
 import pandas as pd
 import json
 from model import Place, CSVPlaceData, PlaceBasicData, PlaceScrapedData
-from collections import namedtuple
+from concurrent.futures import Executor
+from dataclasses import dataclass, field
 import chromadb.utils.embedding_functions as embedding_functions
 from dotenv import load_dotenv
 import os
 from pprint import pprint
-from openai import OpenAI
-from sentence_transformers import CrossEncoder
+from summarizer import PlaceSummarizer, estimate_tokens
+from rate_limiter import RateLimiter
+from reranker import load_reranker
+from cache import CACHE_PATH, EmbeddingCache, SummaryCache, content_hash
+from localities import Locality
+from db_pool import ReadConnectionPool
 
-Locality = namedtuple('Locality', ['id', 'name', 'full_name', 'latitude', 'longitude', 'type'])
 load_dotenv()
 OPENAI_API_KEY = os.getenv('OPENAI_API_KEY')
 
+# OpenAI accepts up to 2048 inputs per embeddings request
+EMBEDDING_BATCH_SIZE = 1000
+DOCUMENTS_PER_PLACE = 4
+DOCUMENT_TYPES = ['description', 'atmosphere', 'food_drink', 'special_features']
+SQLITE_BATCH_SIZE = 5000
+
+# how each document type counts towards a place's score with fusion='weighted'
+DEFAULT_FUSION_WEIGHTS = {'description': 1.0, 'atmosphere': 1.0, 'food_drink': 1.0, 'special_features': 0.5}
+MAX_SEARCH_FETCH = 200
+# (hot query name, table alias) pairs that are meant to scan a table, check_query_plans flags every other scan
+ALLOWED_PLAN_SCANS = set()
+
+EARTH_RADIUS_M = 6_371_000
+METERS_PER_DEGREE_LAT = 111_320
+# k-nearest searches without a radius widen the bounding box up to this distance
+MAX_NEARBY_RADIUS_M = 50_000
+
+# per-person dollar ranges for Google's price tiers; the other price levels are already ranges like '$10-20'
+PRICE_TIER_RANGES = {'$': (1, 15), '$$': (15, 35), '$$$': (35, 75), '$$$$': (75, None)}
+# stands in for the missing upper bound of '$100+' style levels, so price_max stays a plain range bound
+OPEN_ENDED_PRICE_MAX = 10_000
+
+# Google category keys with the "restaurant" suffix dropped, plus spellings users type for them
+CATEGORY_ALIASES = {
+    '': 'restaurant',
+    'cafe': 'coffee_shop',
+    'coffee': 'coffee_shop',
+    'pizzeria': 'pizza',
+    'steakhouse': 'steak_house',
+    'burger': 'hamburger',
+    'kbbq': 'korean_barbecue',
+    'noodle': 'noodles',
+}
+# broader keys also match their more specific categories, e.g. a 'japanese' filter finds sushi and ramen places
+CATEGORY_GROUPS = {
+    'bar': ['cocktail_bar', 'wine_bar', 'pub', 'irish_pub', 'gastropub', 'lounge', 'beer_garden', 'live_music_bar',
+            'brewery', 'bar_grill'],
+    'japanese': ['sushi', 'ramen', 'izakaya', 'udon_noodle', 'japanese_curry', 'japanese_steakhouse', 'shabu_shabu'],
+    'chinese': ['sichuan', 'dumpling', 'hot_pot', 'chinese_noodle'],
+    'korean': ['korean_barbecue'],
+    'italian': ['pizza', 'tuscan', 'roman'],
+    'mexican': ['taco'],
+    'american': ['new_american', 'southern', 'southwestern', 'hamburger', 'diner', 'soul_food', 'cheesesteak', 'chicken'],
+    'dessert': ['dessert_shop', 'ice_cream_shop', 'bakery', 'cake_shop'],
+    'noodles': ['ramen', 'udon_noodle', 'chinese_noodle'],
+    'seafood': ['oyster_bar', 'sushi'],
+    'steak_house': ['japanese_steakhouse'],
+}
+
+
+# per-request queries, kept here so check_query_plans can EXPLAIN exactly what runs
+PLACE_DETAILS_SQL = """
+    SELECT p.name, p.rating, p.price_level, p.category, p.formatted_address,
+           p.description, p.reviews_json, p.atmosphere_json,
+           GROUP_CONCAT(l.name || ' (' || l.type || ')') as localities
+    FROM Places p
+    LEFT JOIN PlaceLocalities pl ON p.id = pl.place_id
+    LEFT JOIN Localities l ON pl.locality_id = l.id
+    WHERE p.id = ?
+    GROUP BY p.id
+"""
+PLACE_LOCALITIES_SQL = """
+    SELECT p.id, p.name, l.id, l.name, l.type
+    FROM Places p
+    JOIN PlaceLocalities pl ON p.id = pl.place_id
+    JOIN Localities l ON pl.locality_id = l.id
+    WHERE p.id IN ({placeholders})
+"""
+SEARCH_TEXT_SQL = """
+    SELECT place_id, name, bm25(PlacesFts, 0.0, 10.0, 4.0, 2.0, 1.0, 2.0) AS rank,
+           snippet(PlacesFts, -1, '[', ']', '...', 12)
+    FROM PlacesFts
+    WHERE PlacesFts MATCH ?
+    ORDER BY rank
+    LIMIT ?
+"""
+
 
 def extract_locality_data_from_geocode_neighbourhoods(geocode_neighbourhoods: list[dict]) -> dict[str, Locality]:
 
@@ -44,11 +130,182 @@ def extract_locality_data_from_geocode_neighbourhoods(geocode_neighbourhoods: li
     return localities
 
 
+def parse_price_level(price_level: str) -> tuple[int | None, int | None]:
+    """Map '$$' tiers and '$10-20' / '$100+' ranges to a per-person (min, max) dollar range"""
+    if not isinstance(price_level, str):
+        return None, None
+    price_level = price_level.strip()
+    if price_level in PRICE_TIER_RANGES:
+        return PRICE_TIER_RANGES[price_level]
+    if match := re.fullmatch(r'\$(\d+)\s*[-\u2013]\s*\$?(\d+)', price_level):
+        return int(match.group(1)), int(match.group(2))
+    if match := re.fullmatch(r'\$(\d+)\+', price_level):
+        return int(match.group(1)), None
+    return None, None
+
+
+def price_range(price_level: str) -> tuple[int | None, int | None]:
+    """parse_price_level with open-ended ranges capped at OPEN_ENDED_PRICE_MAX, as stored for range filters"""
+    price_min, price_max = parse_price_level(price_level)
+    if price_min is None:
+        return None, None
+    return price_min, price_max if price_max is not None else OPEN_ENDED_PRICE_MAX
+
+
+def normalize_category(category: str) -> str | None:
+    """Taxonomy key for a category: 'Italian restaurant' -> 'italian', 'Cocktail bar' -> 'cocktail_bar'"""
+    if not isinstance(category, str) or not category.strip():
+        return None
+    key = re.sub(r'\(.*?\)|\brestaurant\b', '', category.lower())
+    key = re.sub(r'[^a-z0-9]+', '_', key).strip('_')
+    return CATEGORY_ALIASES.get(key, key)
+
+
+def category_keys(categories: str | list[str]) -> list[str]:
+    """Taxonomy keys matching user-supplied categories, including the specific categories of broader ones"""
+    categories = [categories] if isinstance(categories, str) else categories
+    keys = set()
+    for category in categories:
+        key = normalize_category(category)
+        if key is None:
+            continue
+        # users write plurals ("tacos", "wine bars"), stored categories are singular
+        if key not in CATEGORY_GROUPS and not key.endswith('ss'):
+            key = CATEGORY_ALIASES.get(key.removesuffix('s'), key.removesuffix('s'))
+        keys.add(key)
+        keys.update(CATEGORY_GROUPS.get(key, []))
+    return sorted(keys)
+
+
+def place_metadata(place: Place) -> dict:
+    """Filterable Chroma metadata shared by all of a place's documents"""
+    metadata = {
+        'id': place.place_id,
+        'name': place.name,
+        'category': place.category.strip().lower() if isinstance(place.category, str) else '',
+        # same taxonomy key as Places.category_key, so vector and SQL category filters agree
+        'category_key': normalize_category(place.category) or '',
+        'business_status': place.business_status if isinstance(place.business_status, str) else '',
+    }
+    if place.rating is not None:
+        metadata['rating'] = float(place.rating)
+
+    price_min, price_max = price_range(place.price_level)
+    if price_min is not None:
+        metadata['price_min'] = price_min
+        metadata['price_max'] = price_max
+
+    # Chroma metadata can't hold lists, so each locality becomes its own boolean key
+    for locality_id in extract_locality_data_from_geocode_neighbourhoods(place.geocode_neighbourhoods or []):
+        metadata[f'locality:{locality_id}'] = True
+    return metadata
+
+
+def build_where(category: str | list[str] = None, price_min: int = None, price_max: int = None, min_rating: float = None,
+                open_only: bool = False, locality_ids: list[str] = None) -> dict | None:
+    """Compile structured search constraints into a Chroma where clause"""
+    clauses = []
+    if category and (keys := category_keys(category)):
+        clauses.append({'category_key': {'$in': keys}})
+    if price_max is not None:
+        # the place's cheapest price has to fit the budget
+        clauses.append({'price_min': {'$lte': price_max}})
+    if price_min is not None:
+        clauses.append({'price_max': {'$gte': price_min}})
+    if min_rating is not None:
+        clauses.append({'rating': {'$gte': min_rating}})
+    if open_only:
+        clauses.append({'business_status': 'OPERATIONAL'})
+    if locality_ids:
+        locality_clauses = [{f'locality:{locality_id}': True} for locality_id in locality_ids]
+        clauses.append(locality_clauses[0] if len(locality_clauses) == 1 else {'$or': locality_clauses})
+
+    if not clauses:
+        return None
+    return clauses[0] if len(clauses) == 1 else {'$and': clauses}
+
+
+def place_content_hash(place: Place) -> str:
+    """Hash of every place field that ends up in the SQLite row or the Chroma documents"""
+    return content_hash(json.dumps([
+        place.name, place.url, place.business_status, place.formatted_address, place.coordinates,
+        place.place_types, place.rating, place.price_level, place.category, place.description,
+        place.reviews, place.atmosphere, place.geocode_neighbourhoods
+    ], sort_keys=True, default=str))
+
+
+@dataclass
+class IndexReport:
+    added: list[str] = field(default_factory=list)
+    updated: list[str] = field(default_factory=list)
+    refreshed: list[str] = field(default_factory=list)  # re-scraped but content unchanged
+    deleted: list[str] = field(default_factory=list)
+    unchanged: list[str] = field(default_factory=list)
+    failed: list[str] = field(default_factory=list)
+
+    def summary(self) -> str:
+        return (f"{len(self.added)} added, {len(self.updated)} updated, {len(self.refreshed)} refreshed, "
+                f"{len(self.deleted)} deleted, {len(self.unchanged)} unchanged, {len(self.failed)} failed")
+
+
 class SQLiteStore:
-    def __init__(self, db_path: str):
-        self.conn = sqlite3.connect(db_path)
+    def __init__(self, db_path: str, read_pool: ReadConnectionPool = None):
+        # without a read pool, search tools read through this connection from LangGraph's worker threads
+        self.conn = sqlite3.connect(db_path, check_same_thread=False)
+        self.read_pool = read_pool
         self.cursor = self.conn.cursor()
 
+        # WAL lets bulk loads commit without rewriting the main file, and NORMAL only fsyncs at checkpoints
+        self.cursor.execute("PRAGMA journal_mode=WAL")
+        self.cursor.execute("PRAGMA synchronous=NORMAL")
+        self.cursor.execute("PRAGMA temp_store=MEMORY")
+
+        self._migrate()
+
+    def _reader(self) -> sqlite3.Connection:
+        return self.read_pool.connection() if self.read_pool else self.conn
+
+    def _migrations(self) -> list:
+        # append only, entry n upgrades the schema to version n. Databases from before versioning (user_version 0)
+        # already have some of these applied, so every migration has to be safe to re-run.
+        return [
+            self._create_tables,
+            lambda: self._add_missing_columns('Places', {'content_hash': 'TEXT', 'source': 'TEXT'}),
+            self._create_full_text_index,
+            self._create_geo_index,
+            self._add_normalized_columns,
+            self._retype_place_localities,
+            self._create_covering_indexes,
+            self._create_price_indexes,
+            self._create_index_meta,
+        ]
+
+    @property
+    def schema_version(self) -> int:
+        return self.conn.execute("PRAGMA user_version").fetchone()[0]
+
+    def _migrate(self):
+        migrations = self._migrations()
+        version = self.schema_version
+        if version > len(migrations):
+            raise RuntimeError(f"Database schema version {version} is newer than this code supports ({len(migrations)})")
+
+        while version < len(migrations):
+            # each step and its version bump commit together, and the write lock keeps other processes from running
+            # the same step at once; whoever gets the lock second sees the new version and skips it
+            self.conn.execute("BEGIN IMMEDIATE")
+            try:
+                version = self.schema_version
+                if version < len(migrations):
+                    migrations[version]()
+                    version += 1
+                    self.cursor.execute(f"PRAGMA user_version = {version}")
+                self.conn.commit()
+            except BaseException:
+                self.conn.rollback()
+                raise
+
+    def _create_tables(self):
         self.cursor.execute("""
             CREATE TABLE IF NOT EXISTS Places (
                 id TEXT PRIMARY KEY,
@@ -71,7 +328,6 @@ class SQLiteStore:
         """)
 
         self.cursor.execute("""
-
             CREATE TABLE IF NOT EXISTS Localities (
                 id TEXT PRIMARY KEY,
                 name TEXT,
@@ -89,118 +345,609 @@ class SQLiteStore:
                 PRIMARY KEY(place_id, locality_id)
             )
         """)
+
+    def _add_normalized_columns(self):
+        # price_level and category are free text, these columns hold them normalized for indexed range and equality lookups
+        self._add_missing_columns('Places', {'price_min': 'INTEGER', 'price_max': 'INTEGER', 'category_key': 'TEXT'})
+        self.cursor.execute("CREATE INDEX IF NOT EXISTS idx_places_price_min ON Places(price_min)")
+        self.cursor.execute("CREATE INDEX IF NOT EXISTS idx_places_price_max ON Places(price_max)")
+        self.cursor.execute("CREATE INDEX IF NOT EXISTS idx_places_category_key ON Places(category_key)")
+        self._update_normalized_columns()
+
+    def _retype_place_localities(self):
+        # locality_id was declared INTEGER but holds the TEXT ids of Localities, and the affinity mismatch kept
+        # joins from using the Localities primary key. SQLite can't change a column type, so rebuild the table.
+        column_types = {row[1]: row[2] for row in self.cursor.execute("PRAGMA table_info(PlaceLocalities)")}
+        if column_types.get('locality_id') == 'TEXT':
+            return
+        self.cursor.execute("""
+            CREATE TABLE PlaceLocalitiesText(
+                place_id TEXT REFERENCES places(id),
+                locality_id TEXT REFERENCES localities(id),
+                PRIMARY KEY(place_id, locality_id)
+            )
+        """)
+        self.cursor.execute("INSERT INTO PlaceLocalitiesText SELECT place_id, CAST(locality_id AS TEXT) FROM PlaceLocalities")
+        self.cursor.execute("DROP TABLE PlaceLocalities")
+        self.cursor.execute("ALTER TABLE PlaceLocalitiesText RENAME TO PlaceLocalities")
+
+    def _create_covering_indexes(self):
+        # places in a locality; the primary key only covers the place -> localities direction
+        self.cursor.execute("CREATE INDEX IF NOT EXISTS idx_place_localities_locality ON PlaceLocalities(locality_id, place_id)")
+        # locality lookups by name from the free-form SQL tools
+        self.cursor.execute("CREATE INDEX IF NOT EXISTS idx_localities_name ON Localities(name COLLATE NOCASE, type)")
+        # rating filters and best-rated-first ordering
+        self.cursor.execute("CREATE INDEX IF NOT EXISTS idx_places_rating ON Places(rating)")
+
+    def _create_price_indexes(self):
+        # price filters compare both ends of a place's range; these replace the single column indexes they start with
+        self.cursor.execute("CREATE INDEX IF NOT EXISTS idx_places_price_range ON Places(price_max, price_min)")
+        self.cursor.execute("CREATE INDEX IF NOT EXISTS idx_places_category_price ON Places(category_key, price_min)")
+        self.cursor.execute("DROP INDEX IF EXISTS idx_places_price_max")
+        self.cursor.execute("DROP INDEX IF EXISTS idx_places_category_key")
+        # without statistics the planner walks idx_places_rating for the ORDER BY rather than searching a price range
+        self.cursor.execute("ANALYZE")
+
+    def _create_index_meta(self):
+        # index_version counts writes to either store, so anything cached from search results can tell it is stale
+        self.cursor.execute("CREATE TABLE IF NOT EXISTS IndexMeta (key TEXT PRIMARY KEY, value INTEGER NOT NULL)")
+        self.cursor.execute("INSERT OR IGNORE INTO IndexMeta (key, value) VALUES ('version', 0)")
+
+    def _create_full_text_index(self):
+        # BM25 index over the text of each place, kept in sync with Places by triggers
+        self.cursor.execute("""
+            CREATE VIRTUAL TABLE IF NOT EXISTS PlacesFts USING fts5(
+                place_id UNINDEXED,
+                name,
+                category,
+                description,
+                reviews,
+                atmosphere,
+                tokenize='porter unicode61 remove_diacritics 2'
+            )
+        """)
+        self.cursor.execute("""
+            CREATE TRIGGER IF NOT EXISTS places_fts_insert AFTER INSERT ON Places BEGIN
+                INSERT INTO PlacesFts(rowid, place_id, name, category, description, reviews, atmosphere)
+                VALUES (new.rowid, new.id, new.name, new.category, new.description, new.reviews_json, new.atmosphere_json);
+            END
+        """)
+        self.cursor.execute("""
+            CREATE TRIGGER IF NOT EXISTS places_fts_update AFTER UPDATE OF name, category, description, reviews_json, atmosphere_json ON Places BEGIN
+                DELETE FROM PlacesFts WHERE rowid = old.rowid;
+                INSERT INTO PlacesFts(rowid, place_id, name, category, description, reviews, atmosphere)
+                VALUES (new.rowid, new.id, new.name, new.category, new.description, new.reviews_json, new.atmosphere_json);
+            END
+        """)
+        self.cursor.execute("""
+            CREATE TRIGGER IF NOT EXISTS places_fts_delete AFTER DELETE ON Places BEGIN
+                DELETE FROM PlacesFts WHERE rowid = old.rowid;
+            END
+        """)
+
+        # backfill databases indexed before the full text index existed
+        places_count = self.cursor.execute("SELECT COUNT(*) FROM Places").fetchone()[0]
+        fts_count = self.cursor.execute("SELECT COUNT(*) FROM PlacesFts").fetchone()[0]
+        if places_count != fts_count:
+            self._fill_full_text_index()
+
+    def rebuild_full_text_index(self):
+        """Repopulate PlacesFts from Places, e.g. after a VACUUM renumbers rowids"""
+        with self.conn:
+            self._fill_full_text_index()
+
+    def _fill_full_text_index(self):
+        self.cursor.execute("DELETE FROM PlacesFts")
+        self.cursor.execute("""
+            INSERT INTO PlacesFts(rowid, place_id, name, category, description, reviews, atmosphere)
+            SELECT rowid, id, name, category, description, reviews_json, atmosphere_json FROM Places
+        """)
+
+    def _create_geo_index(self):
+        # R*Tree over place coordinates, keyed by Places rowid and kept in sync by triggers
+        self.cursor.execute("CREATE VIRTUAL TABLE IF NOT EXISTS PlacesGeo USING rtree(id, min_lat, max_lat, min_lng, max_lng)")
+        self.cursor.execute("""
+            CREATE TRIGGER IF NOT EXISTS places_geo_insert AFTER INSERT ON Places
+            WHEN new.latitude IS NOT NULL AND new.longitude IS NOT NULL BEGIN
+                INSERT INTO PlacesGeo VALUES (new.rowid, new.latitude, new.latitude, new.longitude, new.longitude);
+            END
+        """)
+        self.cursor.execute("""
+            CREATE TRIGGER IF NOT EXISTS places_geo_update AFTER UPDATE OF latitude, longitude ON Places BEGIN
+                DELETE FROM PlacesGeo WHERE id = old.rowid;
+                INSERT INTO PlacesGeo SELECT new.rowid, new.latitude, new.latitude, new.longitude, new.longitude
+                WHERE new.latitude IS NOT NULL AND new.longitude IS NOT NULL;
+            END
+        """)
+        self.cursor.execute("""
+            CREATE TRIGGER IF NOT EXISTS places_geo_delete AFTER DELETE ON Places BEGIN
+                DELETE FROM PlacesGeo WHERE id = old.rowid;
+            END
+        """)
+
+        places_count = self.cursor.execute("SELECT COUNT(*) FROM Places WHERE latitude IS NOT NULL AND longitude IS NOT NULL").fetchone()[0]
+        geo_count = self.cursor.execute("SELECT COUNT(*) FROM PlacesGeo").fetchone()[0]
+        if places_count != geo_count:
+            self._fill_geo_index()
+
+    def rebuild_geo_index(self):
+        """Repopulate PlacesGeo from Places, e.g. after a VACUUM renumbers rowids"""
+        with self.conn:
+            self._fill_geo_index()
+
+    def _fill_geo_index(self):
+        self.cursor.execute("DELETE FROM PlacesGeo")
+        self.cursor.execute("""
+            INSERT INTO PlacesGeo SELECT rowid, latitude, latitude, longitude, longitude
+            FROM Places WHERE latitude IS NOT NULL AND longitude IS NOT NULL
+        """)
+
+    def nearby(self, latitude: float, longitude: float, radius_m: float = None, k: int = 10, category: str | list[str] = None,
+               price_min: int = None, price_max: int = None, min_rating: float = None, open_only: bool = False) -> list[dict]:
+        """Places closest to a coordinate, optionally within radius_m, nearest first.
+
+        Candidates come from an R*Tree bounding-box lookup and are ranked by exact haversine distance.
+        Without a radius the box widens until k places are found or MAX_NEARBY_RADIUS_M is reached.
+        Filters mean the same as in find_places.
+        """
+        conditions, params = self._place_filters(category, price_min, price_max, min_rating, open_only=open_only)
+
+        search_radius = radius_m or 1000
+        while True:
+            places = self._places_within(latitude, longitude, search_radius, conditions, params)
+            if radius_m or len(places) >= k or search_radius >= MAX_NEARBY_RADIUS_M:
+                break
+            search_radius = min(search_radius * 2, MAX_NEARBY_RADIUS_M)
+
+        return places[:k]
+
+    def _places_within_query(self, latitude: float, longitude: float, radius_m: float, conditions: list[str],
+                             params: list) -> tuple[str, list]:
+        lat_delta = radius_m / METERS_PER_DEGREE_LAT
+        lng_delta = radius_m / (METERS_PER_DEGREE_LAT * max(math.cos(math.radians(latitude)), 0.01))
+        where = ''.join(f" AND {condition}" for condition in conditions)
+        return f"""
+            SELECT p.id, p.name, p.category, p.rating, p.price_level, p.formatted_address, p.latitude, p.longitude
+            FROM PlacesGeo g
+            JOIN Places p ON p.rowid = g.id
+            WHERE g.max_lat >= ? AND g.min_lat <= ? AND g.max_lng >= ? AND g.min_lng <= ?{where}
+        """, [latitude - lat_delta, latitude + lat_delta, longitude - lng_delta, longitude + lng_delta] + params
+
+    def _places_within(self, latitude: float, longitude: float, radius_m: float, conditions: list[str], params: list) -> list[dict]:
+        rows = self._reader().execute(*self._places_within_query(latitude, longitude, radius_m, conditions, params)).fetchall()
+        if not rows:
+            return []
+
+        # haversine over every candidate at once
+        lats = np.radians([row[6] for row in rows])
+        lngs = np.radians([row[7] for row in rows])
+        origin_lat = math.radians(latitude)
+        a = (np.sin((lats - origin_lat) / 2) ** 2
+             + math.cos(origin_lat) * np.cos(lats) * np.sin((lngs - math.radians(longitude)) / 2) ** 2)
+        distances = 2 * EARTH_RADIUS_M * np.arcsin(np.sqrt(a))
+
+        order = np.argsort(distances)
+        return [
+            {
+                'id': rows[i][0], 'name': rows[i][1], 'category': rows[i][2], 'rating': rows[i][3],
+                'price_level': rows[i][4], 'address': rows[i][5], 'distance_m': round(float(distances[i]))
+            }
+            for i in order if distances[i] <= radius_m
+        ]
+
+    def find_places(self, category: str | list[str] = None, price_min: int = None, price_max: int = None, min_rating: float = None,
+                    locality_ids: list[str] = None, open_only: bool = False, limit: int = 20) -> list[dict]:
+        """Places matching every given constraint, best rated first.
+
+        category is matched through the category taxonomy ("italian" also finds pizza places), and a place
+        fits the price range when its own per-person range overlaps it.
+        """
+        rows = self._reader().execute(*self._find_places_query(category, price_min, price_max, min_rating, locality_ids,
+                                                          open_only, limit)).fetchall()
+        return [
+            {
+                'id': place_id, 'name': name, 'category': category, 'rating': rating, 'price_level': price_level,
+                'address': address, 'neighborhoods': neighborhoods
+            }
+            for place_id, name, category, rating, price_level, address, neighborhoods in rows
+        ]
+
+    @staticmethod
+    def _place_filters(category: str | list[str] = None, price_min: int = None, price_max: int = None,
+                       min_rating: float = None, locality_ids: list[str] = None, open_only: bool = False) -> tuple[list[str], list]:
+        """SQL conditions on Places aliased as p and their parameters, shared by every search over Places"""
+        conditions = []
+        params = []
+        if category:
+            keys = category_keys(category)
+            conditions.append(f"p.category_key IN ({','.join(['?' for _ in keys])})")
+            params.extend(keys)
+        # a place fits the price range when its own per-person range overlaps it
+        if price_max is not None:
+            conditions.append("p.price_min <= ?")
+            params.append(price_max)
+        if price_min is not None:
+            conditions.append("p.price_max >= ?")
+            params.append(price_min)
+        if min_rating is not None:
+            conditions.append("p.rating >= ?")
+            params.append(min_rating)
+        if open_only:
+            conditions.append("p.business_status = 'OPERATIONAL'")
+        if locality_ids:
+            # an IN subquery lets SQLite start from the locality index instead of checking every place
+            conditions.append(f"""p.id IN (SELECT pl.place_id FROM PlaceLocalities pl
+                                           WHERE pl.locality_id IN ({','.join(['?' for _ in locality_ids])}))""")
+            params.extend(locality_ids)
+        return conditions, params
+
+    def _find_places_query(self, category: str | list[str] = None, price_min: int = None, price_max: int = None,
+                           min_rating: float = None, locality_ids: list[str] = None, open_only: bool = False,
+                           limit: int = 20) -> tuple[str, list]:
+        conditions, params = self._place_filters(category, price_min, price_max, min_rating, locality_ids, open_only)
+        where = f"WHERE {' AND '.join(conditions)}" if conditions else ''
+        # NULL ratings sort last in descending order
+        return f"""
+            SELECT p.id, p.name, p.category, p.rating, p.price_level, p.formatted_address,
+                   (SELECT GROUP_CONCAT(l.name, ', ') FROM PlaceLocalities pl JOIN Localities l ON l.id = pl.locality_id
+                    WHERE pl.place_id = p.id AND l.type = 'neighborhood')
+            FROM Places p
+            {where}
+            ORDER BY p.rating DESC, p.name
+            LIMIT ?
+        """, params + [limit]
+
+    def get_place_details(self, place_id: str) -> dict | None:
+        """Everything stored about one place, with its localities, or None if it isn't saved"""
+        row = self._reader().execute(PLACE_DETAILS_SQL, (place_id,)).fetchone()
+        if row is None:
+            return None
+        name, rating, price_level, category, address, description, reviews_json, atmosphere_json, localities = row
+        return {
+            'name': name, 'rating': rating, 'price_level': price_level, 'category': category, 'address': address,
+            'description': description, 'reviews': json.loads(reviews_json) if reviews_json else [],
+            'atmosphere': json.loads(atmosphere_json) if atmosphere_json else [], 'localities': localities
+        }
+
+    def get_place_localities(self, place_ids: list[str]) -> list[tuple[str, str, str, str, str]]:
+        """(place id, place name, locality id, locality name, locality type) for every locality of the given places"""
+        placeholders = ','.join(['?' for _ in place_ids])
+        return self._reader().execute(PLACE_LOCALITIES_SQL.format(placeholders=placeholders), place_ids).fetchall()
+
+    def search_text(self, query: str, limit: int = 20) -> list[dict]:
+        """BM25 keyword search over place names, categories, descriptions, reviews and atmosphere"""
+        # quote every term so user text can't be parsed as FTS5 query syntax
+        terms = re.findall(r"\w+", query.lower())
+        if not terms:
+            return []
+        match = ' OR '.join(f'"{term}"' for term in terms)
+
+        rows = self._reader().execute(SEARCH_TEXT_SQL, (match, limit)).fetchall()
+        # bm25() is lower for better matches
+        return [{'id': place_id, 'name': name, 'score': -rank, 'snippet': snippet} for place_id, name, rank, snippet in rows]
+
+    def hot_queries(self) -> dict[str, tuple[str, list]]:
+        """Representative instances of the queries the search tools run per request"""
+        return {
+            'place_details': (PLACE_DETAILS_SQL, ['place']),
+            'place_localities': (PLACE_LOCALITIES_SQL.format(placeholders='?,?'), ['place', 'other place']),
+            'find_places_by_category': self._find_places_query(category='japanese', price_max=30, open_only=True),
+            'find_places_by_locality': self._find_places_query(locality_ids=['locality'], min_rating=4),
+            'find_places_by_price': self._find_places_query(price_min=75),
+            'find_places_by_rating': self._find_places_query(min_rating=4.5),
+            'nearby': self._places_within_query(40.7, -74.0, 1000, *self._place_filters(category='bar', price_max=30)),
+            'search_text': (SEARCH_TEXT_SQL, ['"omakase"', 10]),
+            'localities_by_name': ("SELECT id FROM Localities WHERE name = ? COLLATE NOCASE", ['Williamsburg']),
+        }
+
+    def check_query_plans(self) -> dict[str, list[str]]:
+        """EXPLAIN QUERY PLAN every hot query and return the table scans in each plan, by query name"""
+        regressions = {}
+        for name, (sql, params) in self.hot_queries().items():
+            plan = [detail for _, _, _, detail in self.conn.execute(f"EXPLAIN QUERY PLAN {sql}", params)]
+            # "SCAN x USING INDEX ..." still visits every row of x, only walking it in index order; FTS and R*Tree
+            # lookups show as virtual table scans and a covering index scan never touches the table
+            scans = [detail for detail in plan
+                     if (match := re.match(r'SCAN (\w+)', detail))
+                     and 'VIRTUAL TABLE' not in detail and 'COVERING INDEX' not in detail
+                     and (name, match.group(1)) not in ALLOWED_PLAN_SCANS]
+            if scans:
+                regressions[name] = scans
+        return regressions
+
+    def get_localities(self) -> list[Locality]:
+        rows = self._reader().execute("""
+            SELECT id, name, full_name, latitude, longitude, type FROM Localities
+            WHERE latitude IS NOT NULL AND longitude IS NOT NULL
+        """).fetchall()
+        return [Locality(*row) for row in rows]
+
+    def index_version(self) -> str:
+        """Changes with every write to the index and every schema migration, cheap enough to check per request"""
+        reader = self._reader()
+        schema_version = reader.execute("PRAGMA user_version").fetchone()[0]
+        version = reader.execute("SELECT value FROM IndexMeta WHERE key = 'version'").fetchone()[0]
+        return f"{schema_version}.{version}"
+
+    def bump_index_version(self):
+        """Record a write SQLite doesn't see itself, e.g. to the Chroma collection"""
+        with self.conn:
+            self._bump_index_version()
+
+    def _bump_index_version(self):
+        self.cursor.execute("UPDATE IndexMeta SET value = value + 1 WHERE key = 'version'")
+
+    def get_places(self) -> list[Place]:
+        """Rebuild Place objects from the stored rows"""
+        rows = self.conn.execute("""
+            SELECT id, name, url, business_status, formatted_address, latitude, longitude, place_types_json, rating,
+                   price_level, category, description, reviews_json, atmosphere_json, geocode_neighbourhoods_json, last_scraped
+            FROM Places
+        """).fetchall()
+        places = []
+        for (place_id, name, url, business_status, formatted_address, latitude, longitude, place_types_json, rating,
+             price_level, category, description, reviews_json, atmosphere_json, geocode_neighbourhoods_json, last_scraped) in rows:
+            place = Place(
+                CSVPlaceData(name=name, url=url),
+                PlaceBasicData(name=name, place_id=place_id, business_status=business_status, formatted_address=formatted_address,
+                               coordinates=(latitude, longitude), place_types=json.loads(place_types_json or 'null')),
+                PlaceScrapedData(rating=rating, price_level=price_level, category=category, description=description,
+                                 reviews=json.loads(reviews_json or 'null'), atmosphere=json.loads(atmosphere_json or 'null'))
+            )
+            place.geocode_neighbourhoods = json.loads(geocode_neighbourhoods_json or 'null')
+            place.last_scraped = last_scraped
+            places.append(place)
+        return places
+
+    def _add_missing_columns(self, table: str, columns: dict[str, str]):
+        # databases created before a column existed need it added in place
+        existing = {row[1] for row in self.cursor.execute(f"PRAGMA table_info({table})")}
+        for name, column_type in columns.items():
+            if name not in existing:
+                self.cursor.execute(f"ALTER TABLE {table} ADD COLUMN {name} {column_type}")
+
+    def backfill_normalized_columns(self):
+        """Recompute price_min, price_max and category_key for every place, e.g. after the category taxonomy changes"""
+        with self.conn:
+            self._update_normalized_columns()
+            self._bump_index_version()
+
+    def _update_normalized_columns(self):
+        rows = self.cursor.execute("SELECT id, price_level, category FROM Places").fetchall()
+        self.cursor.executemany("UPDATE Places SET price_min = ?, price_max = ?, category_key = ? WHERE id = ?",
+                                [(*price_range(price_level), normalize_category(category), place_id)
+                                 for place_id, price_level, category in rows])
+
+    def get_index_state(self) -> dict[str, tuple[str, str, str]]:
+        """Map each stored place id to its (last_scraped, content_hash, source)"""
+        self.cursor.execute("SELECT id, last_scraped, content_hash, source FROM Places")
+        return {place_id: (last_scraped, stored_hash, source) for place_id, last_scraped, stored_hash, source in self.cursor.fetchall()}
+
+    def invalidate(self, place_ids: list[str]):
+        """Clear stored content hashes so the next incremental run re-indexes these places"""
+        self.cursor.executemany("UPDATE Places SET content_hash = NULL WHERE id = ?", [(place_id,) for place_id in place_ids])
         self.conn.commit()
 
-    def save(self, place: Place):
-        try:
-            locality_data = extract_locality_data_from_geocode_neighbourhoods(place.geocode_neighbourhoods)
-
-            # add all the localities to the database
-            for locality_id, locality in locality_data.items():
-                self.cursor.execute("INSERT OR IGNORE INTO Localities (id, name, full_name, latitude, longitude, type) VALUES (?, ?, ?, ?, ?, ?)",
-                                    (locality_id, locality.name, locality.full_name, locality.latitude, locality.longitude, locality.type))
-
-            # add the place to the database
-            self.cursor.execute("""INSERT INTO Places (id, name, url, business_status, formatted_address, latitude, longitude, place_types_json, rating, price_level, category, description, reviews_json, atmosphere_json, geocode_neighbourhoods_json, last_scraped) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-                                ON CONFLICT(id) DO UPDATE SET
-                                    id=excluded.id,
-                                    name=excluded.name,
-                                    url=excluded.url,
-                                    business_status=excluded.business_status,
-                                    formatted_address=excluded.formatted_address,
-                                    latitude=excluded.latitude,
-                                    longitude=excluded.longitude,
-                                    place_types_json=excluded.place_types_json,
-                                    rating=excluded.rating,
-                                    price_level=excluded.price_level,
-                                    category=excluded.category,
-                                    description=excluded.description,
-                                    reviews_json=excluded.reviews_json,
-                                    atmosphere_json=excluded.atmosphere_json,
-                                    geocode_neighbourhoods_json=excluded.geocode_neighbourhoods_json,
-                                    last_scraped=excluded.last_scraped
-                                """,
-                                (place.place_id, place.name, place.url, place.business_status, place.formatted_address, place.coordinates[0], place.coordinates[1], json.dumps(place.place_types), place.rating, place.price_level, place.category, place.description, json.dumps(place.reviews), json.dumps(place.atmosphere), json.dumps(place.geocode_neighbourhoods), place.last_scraped))
-
-            # add the place to the localities
-            for locality_id in locality_data:
-                self.cursor.execute("INSERT OR IGNORE INTO PlaceLocalities (place_id, locality_id) VALUES (?, ?)",
-                                    (place.place_id, locality_id))
-
-            self.conn.commit()
-        except Exception as e:
-            if 'UNIQUE constraint failed' in str(e):
-                return
-            print('Error saving place', place.place_id, e)
+    def delete(self, place_ids: list[str]):
+        rows = [(place_id,) for place_id in place_ids]
+        if not rows:
+            return
+        with self.conn:
+            self.conn.executemany("DELETE FROM PlaceLocalities WHERE place_id = ?", rows)
+            self.conn.executemany("DELETE FROM Places WHERE id = ?", rows)
+            self._bump_index_version()
+
+    def save(self, place: Place, source: str = None):
+        self.save_many([place], source=source)
+
+    def save_many(self, places: list[Place], source: str = None, batch_size: int = SQLITE_BATCH_SIZE):
+        """Write places, their localities and place-locality links in one transaction per batch"""
+        for start in range(0, len(places), batch_size):
+            locality_rows = []
+            place_rows = []
+            place_locality_rows = []
+            for place in places[start:start + batch_size]:
+                try:
+                    locality_data = extract_locality_data_from_geocode_neighbourhoods(place.geocode_neighbourhoods)
+                    place_rows.append((place.place_id, place.name, place.url, place.business_status, place.formatted_address, place.coordinates[0], place.coordinates[1], json.dumps(place.place_types), place.rating, place.price_level,
+                                      place.category, place.description, json.dumps(place.reviews), json.dumps(place.atmosphere), json.dumps(place.geocode_neighbourhoods), place.last_scraped, place_content_hash(place), source,
+                                       *price_range(place.price_level), normalize_category(place.category)))
+                except Exception as e:
+                    # malformed source rows are skipped, database errors below abort the batch
+                    print('Error saving place', place.place_id, e)
+                    continue
+
+                for locality_id, locality in locality_data.items():
+                    locality_rows.append((locality_id, locality.name, locality.full_name, locality.latitude, locality.longitude, locality.type))
+                    place_locality_rows.append((place.place_id, locality_id))
+
+            # commits the whole batch, or rolls it back and re-raises
+            with self.conn:
+                self.conn.executemany("INSERT OR IGNORE INTO Localities (id, name, full_name, latitude, longitude, type) VALUES (?, ?, ?, ?, ?, ?)",
+                                      locality_rows)
+
+                self.conn.executemany("""INSERT INTO Places (id, name, url, business_status, formatted_address, latitude, longitude, place_types_json, rating, price_level, category, description, reviews_json, atmosphere_json, geocode_neighbourhoods_json, last_scraped, content_hash, source, price_min, price_max, category_key) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+                                    ON CONFLICT(id) DO UPDATE SET
+                                        id=excluded.id,
+                                        name=excluded.name,
+                                        url=excluded.url,
+                                        business_status=excluded.business_status,
+                                        formatted_address=excluded.formatted_address,
+                                        latitude=excluded.latitude,
+                                        longitude=excluded.longitude,
+                                        place_types_json=excluded.place_types_json,
+                                        rating=excluded.rating,
+                                        price_level=excluded.price_level,
+                                        category=excluded.category,
+                                        description=excluded.description,
+                                        reviews_json=excluded.reviews_json,
+                                        atmosphere_json=excluded.atmosphere_json,
+                                        geocode_neighbourhoods_json=excluded.geocode_neighbourhoods_json,
+                                        last_scraped=excluded.last_scraped,
+                                        content_hash=excluded.content_hash,
+                                        source=COALESCE(excluded.source, Places.source),
+                                        price_min=excluded.price_min,
+                                        price_max=excluded.price_max,
+                                        category_key=excluded.category_key
+                                    """,
+                                      place_rows)
+
+                # an updated place may have moved, its links are replaced rather than added to
+                self.conn.executemany("DELETE FROM PlaceLocalities WHERE place_id = ?", [row[:1] for row in place_rows])
+                self.conn.executemany("INSERT OR IGNORE INTO PlaceLocalities (place_id, locality_id) VALUES (?, ?)",
+                                      place_locality_rows)
+                self._bump_index_version()
+
+    def checkpoint(self):
+        """Refresh the planner statistics for the new rows, then fold the WAL back into the main database file so
+        places.db can be copied on its own"""
+        self.cursor.execute("ANALYZE")
+        self.cursor.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+
+
+class CachedOpenAIEmbeddingFunction(embedding_functions.OpenAIEmbeddingFunction):
+    """OpenAI embedding function that only sends texts missing from the embedding cache to the API"""
+
+    def __init__(self, cache: EmbeddingCache, rate_limiter: RateLimiter = None, **kwargs):
+        # subclassing keeps the persisted collection config identical to the plain OpenAI function
+        super().__init__(**kwargs)
+        self.cache = cache
+        self.rate_limiter = rate_limiter
+
+    def __call__(self, input: list[str]) -> list:
+        keys = [self.cache.make_key(text) for text in input]
+        embeddings = self.cache.get_many(self.model_name, keys)
+
+        missing = [i for i, key in enumerate(keys) if key not in embeddings]
+        if missing:
+            if self.rate_limiter:
+                # called from worker threads, so wait for the budget by blocking the thread
+                self.rate_limiter.acquire_blocking(sum(estimate_tokens(input[i]) for i in missing))
+            new_embeddings = super().__call__([input[i] for i in missing])
+            new_embeddings = {keys[i]: embedding for i, embedding in zip(missing, new_embeddings)}
+            self.cache.put_many(self.model_name, new_embeddings)
+            embeddings.update(new_embeddings)
+
+        return [embeddings[key] for key in keys]
 
 
 class ChromaStore:
 
-    def __init__(self, chroma_path: str):
+    def __init__(self, chroma_path: str, summarizer: PlaceSummarizer = None, cache_path: str = CACHE_PATH,
+                 rate_limiter: RateLimiter = None):
         self.chroma_client = chromadb.PersistentClient(path=chroma_path)
+        self.embedding_function = CachedOpenAIEmbeddingFunction(
+            cache=EmbeddingCache(cache_path),
+            rate_limiter=rate_limiter,
+            api_key=OPENAI_API_KEY,
+            model_name="text-embedding-3-small"
+        )
         self.collection = self.chroma_client.get_or_create_collection(
             name="places",
-            embedding_function=embedding_functions.OpenAIEmbeddingFunction(
-                api_key=OPENAI_API_KEY,
-                model_name="text-embedding-3-small"
-            ))
-        self.openai_client = OpenAI(api_key=OPENAI_API_KEY)
-        self.reranker = CrossEncoder("cross-encoder/ms-marco-MiniLM-L-6-v2")
+            embedding_function=self.embedding_function)
+        self.summarizer = summarizer or PlaceSummarizer(api_key=OPENAI_API_KEY, cache=SummaryCache(cache_path))
+        # loaded on first search or in warmup(), so indexing and imports never pay for the model
+        self._reranker = None
+        self._reranker_lock = threading.Lock()
+
+    @property
+    def reranker(self):
+        if self._reranker is None:
+            with self._reranker_lock:
+                if self._reranker is None:
+                    self._reranker = load_reranker()
+        return self._reranker
+
+    def warmup(self):
+        """Load the reranker and the vector index ahead of the first search"""
+        self.reranker.predict([("warmup", "warmup")])
+        # querying with a stored vector loads the HNSW index without an embedding request
+        sample = self.collection.get(limit=1, include=['embeddings'])
+        if len(sample['embeddings']) > 0:
+            self.collection.query(query_embeddings=[sample['embeddings'][0]], n_results=1)
 
     def save(self, place: Place):
-        docs_dict = self.__create_documents_from_place(place)
+        self.save_many([place])
+
+    def save_many(self, places: list[Place], batch_size: int = EMBEDDING_BATCH_SIZE) -> list[str]:
+        """Summarize, embed and upsert the documents for many places, batch_size documents per embedding request.
+        Returns the ids of places that could not be summarized."""
+        failed = []
+        places_per_batch = max(1, batch_size // DOCUMENTS_PER_PLACE)
+        for start in range(0, len(places), places_per_batch):
+            batch = places[start:start + places_per_batch]
+            summaries = self.summarizer.summarize_many(batch)
+
+            ids = []
+            docs = []
+            metadatas = []
+            for place, summarized_data in zip(batch, summaries):
+                if isinstance(summarized_data, Exception):
+                    print('Error summarizing place', place.place_id, summarized_data)
+                    failed.append(place.place_id)
+                    continue
+
+                place_ids, place_docs, place_metadatas = self.create_records(place, summarized_data)
+                ids.extend(place_ids)
+                docs.extend(place_docs)
+                metadatas.extend(place_metadatas)
+
+            if ids:
+                self._upsert_batch(ids, docs, metadatas)
+
+        return failed
+
+    def create_records(self, place: Place, summarized_data: dict = None) -> tuple[list[str], list[str], list[dict]]:
+        """Build the Chroma ids, documents and metadatas for a place"""
         ids = []
         docs = []
         metadatas = []
+        docs_dict = self.__create_documents_from_place(place, summarized_data)
+        metadata = place_metadata(place)
         for key, doc in docs_dict.items():
             ids.append(f"{place.place_id}:{key}")
             docs.append(doc)
-            metadatas.append({
-                'id': place.place_id,
-                'name': place.name,
-                'type': key,
-            })
-        self.collection.add(
+            metadatas.append({**metadata, 'type': key})
+        return ids, docs, metadatas
+
+    def update_metadata(self, places: list[Place], batch_size: int = EMBEDDING_BATCH_SIZE):
+        """Rewrite the filterable metadata of already indexed places without re-embedding them"""
+        ids = []
+        metadatas = []
+        for place in places:
+            metadata = place_metadata(place)
+            for key in DOCUMENT_TYPES:
+                ids.append(f"{place.place_id}:{key}")
+                metadatas.append({**metadata, 'type': key})
+
+        # update fails on ids that don't exist, e.g. places whose summarization failed
+        existing = set()
+        for start in range(0, len(ids), batch_size):
+            existing.update(self.collection.get(ids=ids[start:start + batch_size], include=[])['ids'])
+        records = [(doc_id, metadata) for doc_id, metadata in zip(ids, metadatas) if doc_id in existing]
+        for start in range(0, len(records), batch_size):
+            batch = records[start:start + batch_size]
+            self.collection.update(ids=[doc_id for doc_id, _ in batch], metadatas=[metadata for _, metadata in batch])
+
+    def delete(self, place_ids: list[str]):
+        if place_ids:
+            self.collection.delete(ids=[f"{place_id}:{key}" for place_id in place_ids for key in DOCUMENT_TYPES])
+
+    def _upsert_batch(self, ids: list[str], docs: list[str], metadatas: list[dict]):
+        # the collection's embedding function embeds the whole batch in a single request
+        self.collection.upsert(
             ids=ids,
             documents=docs,
             metadatas=metadatas
         )
 
     def _summarize_place_with_llm(self, place: Place):
-        prompt = f"""\n
-You are extracting semantic descriptions for a venue to improve search and recommendations.
-\n
-Given the following data for a place:
-Name: {place.name}
-Category: {place.category}
-Atmosphere tags: {place.atmosphere}
-Place types: {place.place_types}
-Description: {place.description}
-Reviews: {place.reviews}
-\n
-Produce a JSON object with the following fields:
-- atmosphere: A short (1-2 sentence) natural language description of the venue's vibe, crowd, and setting.
-- food_drink: A short (1-2 sentence) natural language description of the notable food and drink offerings.
-- special_features: A short (1 sentence) list of distinctive features, amenities, or quirks of the venue.
-\n
-Focus on what would help a user choose this place for a specific mood or occasion.
-\n
-Return the JSON object only, no other text.
-"""
-
-        response = self.openai_client.chat.completions.create(
-            model="gpt-5-mini",  # cheaper/faster for batch processing
-            response_format={"type": "json_object"},
-            messages=[
-                {"role": "system", "content": "You are a helpful assistant for summarizing venue details."},
-                {"role": "user", "content": prompt}
-            ],
-            temperature=0.3
-        )
-
-        return json.loads(response.choices[0].message.content)
+        summarized_data = self.summarizer.summarize_many([place])[0]
+        if isinstance(summarized_data, Exception):
+            raise summarized_data
+        return summarized_data
 
-    def __create_documents_from_place(self, place: Place) -> str:
+    def __create_documents_from_place(self, place: Place, summarized_data: dict = None) -> dict[str, str]:
         locality_data = extract_locality_data_from_geocode_neighbourhoods(place.geocode_neighbourhoods)
         neighborhood = None
         city = ''
@@ -213,19 +960,21 @@ Return the JSON object only, no other text.
         description_doc = f"""{place.name} is a {place.category} in {neighborhood if neighborhood else ''}, {city if city else ''}. {f"It's described as a {place.description}" if place.description else ""} It's rated {
             place.rating} out of 5 and has a price level of {place.price_level}."""
 
-        summarrized_data = self._summarize_place_with_llm(place)
+        if summarized_data is None:
+            summarized_data = self._summarize_place_with_llm(place)
         return {
             'description': description_doc,
-            'atmosphere': summarrized_data['atmosphere'],
-            'food_drink': summarrized_data['food_drink'],
-            'special_features': summarrized_data['special_features']
+            'atmosphere': summarized_data['atmosphere'],
+            'food_drink': summarized_data['food_drink'],
+            'special_features': summarized_data['special_features']
         }
 
-    def search(self, query: str, n_results: int = 20, rerank: bool = True):
+    def search(self, query: str, n_results: int = 20, rerank: bool = True, where: dict = None):
         """Search for places"""
         results = self.collection.query(
             query_texts=[query],
-            n_results=n_results
+            n_results=n_results,
+            where=where
         )
         docs = results['documents'][0]
         metadatas = results['metadatas'][0]
@@ -250,22 +999,181 @@ Return the JSON object only, no other text.
 
         return res
 
+    def search_places(self, query: str, k: int = 7, fusion: str = 'max', weights: dict[str, float] = None, rerank: bool = True,
+                      where: dict = None) -> list[dict]:
+        """Search for the top k distinct places, fusing the scores of each place's matching documents.
+
+        fusion is 'max' (best document wins), 'sum' (places matching on several aspects rank higher)
+        or 'weighted' (sum weighted by document type). The number of documents fetched grows until
+        k distinct places are found, so coverage doesn't depend on how many aspects each place matches.
+        where is a Chroma filter (see build_where) applied inside the vector query, so every
+        candidate already satisfies it.
+        """
+        weights = weights or DEFAULT_FUSION_WEIGHTS
+        candidates = self._place_candidates(query, k, fusion, weights, where)
+        if rerank and candidates:
+            scores = self.reranker.predict(self._rerank_pairs(query, candidates))
+            self._apply_rerank_scores(candidates, scores, fusion, weights)
+        return candidates
+
+    async def asearch_places(self, query: str, k: int = 7, fusion: str = 'max', weights: dict[str, float] = None,
+                             rerank: bool = True, where: dict = None, executor: Executor = None) -> list[dict]:
+        """search_places for the event loop: the vector query runs on executor and reranking awaits the reranker's
+        worker thread, so neither holds up other requests"""
+        loop = asyncio.get_running_loop()
+        weights = weights or DEFAULT_FUSION_WEIGHTS
+        candidates = await loop.run_in_executor(executor, self._place_candidates, query, k, fusion, weights, where)
+        if rerank and candidates:
+            # the first search may have to load the model, which blocks
+            reranker = self._reranker or await loop.run_in_executor(executor, lambda: self.reranker)
+            pairs = self._rerank_pairs(query, candidates)
+            if hasattr(reranker, 'apredict'):
+                scores = await reranker.apredict(pairs)
+            else:
+                scores = await loop.run_in_executor(executor, reranker.predict, pairs)
+            self._apply_rerank_scores(candidates, scores, fusion, weights)
+        return candidates
+
+    def _place_candidates(self, query: str, k: int, fusion: str, weights: dict[str, float], where: dict) -> list[dict]:
+        """The top k places by fused vector similarity"""
+        total = self.collection.count()
+        if total == 0:
+            return []
+        n_results = min(k * 2, total)
+        while True:
+            results = self.collection.query(query_texts=[query], n_results=n_results, where=where,
+                                            include=['documents', 'metadatas', 'distances'])
+            places = {}
+            for doc, meta, distance in zip(results['documents'][0], results['metadatas'][0], results['distances'][0]):
+                place = places.setdefault(meta['id'], {'id': meta['id'], 'name': meta['name'], 'documents': {}, 'scores': {}})
+                place['documents'][meta['type']] = doc
+                place['scores'][meta['type']] = self._similarity(distance)
+
+            # fewer documents than asked for means the filter has nothing more to give
+            if len(places) >= k or n_results >= min(total, MAX_SEARCH_FETCH) or len(results['ids'][0]) < n_results:
+                break
+            # scale the fetch by how many documents each distinct place has taken so far
+            n_results = min(total, MAX_SEARCH_FETCH, max(n_results * 2, math.ceil(n_results * k / max(1, len(places)))))
+
+        for place in places.values():
+            place['score'] = self._fuse(place['scores'], fusion, weights)
+        return sorted(places.values(), key=lambda place: place['score'], reverse=True)[:k]
+
+    def _rerank_pairs(self, query: str, candidates: list[dict]) -> list[tuple[str, str]]:
+        # only the documents of the k candidate places are reranked
+        return [(query, doc) for place in candidates for doc in place['documents'].values()]
+
+    def _apply_rerank_scores(self, candidates: list[dict], scores, fusion: str, weights: dict[str, float]):
+        scores = iter(scores)
+        for place in candidates:
+            # squash logits to (0, 1) so they can be summed across documents
+            place['scores'] = {doc_type: 1 / (1 + math.exp(-float(next(scores)))) for doc_type in place['documents']}
+            place['score'] = self._fuse(place['scores'], fusion, weights)
+        candidates.sort(key=lambda place: place['score'], reverse=True)
+
+    def _similarity(self, distance: float) -> float:
+        space = (self.collection.metadata or {}).get('hnsw:space', 'l2')
+        if space == 'cosine':
+            return 1 - distance
+        if space == 'ip':
+            return -distance
+        # OpenAI embeddings are unit length, so squared l2 distance is 2 - 2 * cosine similarity
+        return 1 - distance / 2
+
+    def _fuse(self, scores: dict[str, float], fusion: str, weights: dict[str, float]) -> float:
+        if fusion == 'max':
+            return max(scores.values())
+        if fusion == 'sum':
+            return sum(scores.values())
+        if fusion == 'weighted':
+            return sum(weights.get(doc_type, 1.0) * score for doc_type, score in scores.items())
+        raise ValueError(f"Unknown fusion method: {fusion}")
+
 
 class Indexer:
-    def __init__(self, db_path: str, chroma_path: str):
+    def __init__(self, db_path: str, chroma_path: str, summarizer: PlaceSummarizer = None, cache_path: str = CACHE_PATH):
         self.sqlite_store = SQLiteStore(db_path)
-        self.chroma_store = ChromaStore(chroma_path)
+        self.chroma_store = ChromaStore(chroma_path, summarizer=summarizer, cache_path=cache_path)
 
     def index(self, place: Place):
         self.sqlite_store.save(place)
         self.chroma_store.save(place)
+        self.sqlite_store.bump_index_version()
 
-    def index_csv(self, csv_path: str):
+    def index_many(self, places: list[Place], batch_size: int = EMBEDDING_BATCH_SIZE, source: str = None) -> list[str]:
+        """Index places, returning the ids of those that could not be summarized"""
+        self.sqlite_store.save_many(places, source=source)
+        failed = self.chroma_store.save_many(places, batch_size=batch_size)
+        self.sqlite_store.bump_index_version()
+        self.sqlite_store.invalidate(failed)
+        return failed
+
+    def index_csv(self, csv_path: str, batch_size: int = EMBEDDING_BATCH_SIZE, incremental: bool = False) -> IndexReport:
+        """Index a place checkpoint CSV. Incremental runs only touch places that changed since the last run."""
         df = pd.read_csv(csv_path)
+        places = [self._create_place_from_csv_row(row) for _, row in df.iterrows()]
+        source = os.path.basename(csv_path)
+
+        if incremental:
+            report = self.index_changes(places, source, batch_size=batch_size)
+        else:
+            failed = self.index_many(places, batch_size=batch_size, source=source)
+            report = IndexReport(added=[place.place_id for place in places if place.place_id not in failed], failed=failed)
+
+        self.sqlite_store.checkpoint()
+        return report
+
+    def index_changes(self, places: list[Place], source: str, batch_size: int = EMBEDDING_BATCH_SIZE) -> IndexReport:
+        """Diff places against the stored index, upsert what changed and delete what vanished from source"""
+        report = IndexReport()
+        stored = self.sqlite_store.get_index_state()
+        # later rows win when a place appears more than once in the source
+        places_by_id = {place.place_id: place for place in places}
+
+        changed = []
+        refreshed = []
+        for place_id, place in places_by_id.items():
+            change = self.diff_place(place, stored, source)
+            getattr(report, change).append(place_id)
+            if change in ('added', 'updated'):
+                changed.append(place)
+            elif change == 'refreshed':
+                refreshed.append(place)
+        report.deleted = self.vanished_places(stored, source, places_by_id)
+
+        self.sqlite_store.save_many(refreshed, source=source)
+        report.failed = self.index_many(changed, batch_size=batch_size, source=source)
+        self.chroma_store.delete(report.deleted)
+        self.sqlite_store.delete(report.deleted)
+
+        print(f'Indexed {source}: {report.summary()}')
+        return report
+
+    @staticmethod
+    def diff_place(place: Place, stored: dict[str, tuple[str, str, str]], source: str) -> str:
+        """How a place read from source compares to the stored index, as the IndexReport list it belongs in:
+        'added', 'updated', 'refreshed' or 'unchanged'"""
+        if place.place_id not in stored:
+            return 'added'
+        last_scraped, stored_hash, stored_source = stored[place.place_id]
+        if stored_hash != place_content_hash(place):
+            return 'updated'
+        if last_scraped != place.last_scraped or stored_source != source:
+            # nothing searchable changed, so only the SQLite row needs the new scrape metadata
+            return 'refreshed'
+        return 'unchanged'
+
+    @staticmethod
+    def vanished_places(stored: dict[str, tuple[str, str, str]], source: str, seen) -> list[str]:
+        """Ids of stored places that source no longer lists"""
+        # only places previously indexed from this source can have vanished from it
+        return [place_id for place_id, (_, _, stored_source) in stored.items()
+                if stored_source == source and place_id not in seen]
 
-        for i, row in df.iterrows():
-            place = self._create_place_from_csv_row(row)
-            self.index(place)
+    def refresh_search_metadata(self):
+        """Backfill filterable Chroma metadata for places indexed before it existed"""
+        self.chroma_store.update_metadata(self.sqlite_store.get_places())
+        self.sqlite_store.bump_index_version()
 
     def _create_place_from_csv_row(self, row: dict) -> Place:
         """Create a Place object from CSV row with proper type conversion"""
@@ -323,6 +1231,7 @@ class Indexer:
         return place
 
 
-indexer = Indexer(db_path='places.db', chroma_path='places_vector_db')
-# indexer.index_csv('/Users/dilraj/Downloads/Takeout-2/Saved/NY food and drinks_place_checkpoint.csv')
-# indexer.index_csv('/Users/dilraj/Downloads/Takeout-2/Saved/San Francisco_place_checkpoint.csv')
+if __name__ == "__main__":
+    indexer = Indexer(db_path='places.db', chroma_path='places_vector_db')
+    # indexer.index_csv('/Users/dilraj/Downloads/Takeout-2/Saved/NY food and drinks_place_checkpoint.csv')
+    # indexer.index_csv('/Users/dilraj/Downloads/Takeout-2/Saved/San Francisco_place_checkpoint.csv')
@@ -0,0 +1,221 @@
+import re
+import unicodedata
+from collections import namedtuple
+
+import numpy as np
+from scipy.spatial import cKDTree
+
+EARTH_RADIUS_M = 6_371_000
+
+# a neighborhood centroid further away than this is not where the user is
+MAX_NEIGHBORHOOD_DISTANCE_M = 2_500
+MAX_CITY_DISTANCE_M = 50_000
+
+# nicknames people use for localities, keyed and valued by normalized name; acronyms of 3+ word names are added automatically
+LOCALITY_ALIASES = {
+    'nyc': 'new york',
+    'new york city': 'new york',
+    'sf': 'san francisco',
+    'san fran': 'san francisco',
+    'wburg': 'williamsburg',
+    'billyburg': 'williamsburg',
+    'burg': 'williamsburg',
+    'fidi': 'financial district',
+    'ev': 'east village',
+    'wv': 'west village',
+    'the village': 'greenwich village',
+    'ktown': 'koreatown',
+    'k town': 'koreatown',
+    'bed stuy': 'bedford stuyvesant',
+    'hk': 'hells kitchen',
+    'midtown': 'midtown manhattan',
+    'meatpacking': 'meatpacking district',
+    'the mission': 'mission district',
+    'gramercy': 'gramercy park',
+}
+# boroughs whose neighborhoods carry their city's name in the full name instead ("Tribeca, New York, NY, USA"),
+# keyed by normalized borough and valued by that normalized city name
+BOROUGHS_NAMED_AFTER_CITY = {'manhattan': 'new york'}
+# words that qualify a place name rather than being part of it
+LOCALITY_FILLER_WORDS = re.compile(r'^(?:in|around|near)\s+|\s+(?:area|neighborhood|neighbourhood|nbhd)$')
+# a prefix shorter than this, or completing to more localities than this, is too ambiguous to resolve
+MIN_PREFIX_LENGTH = 3
+MAX_PREFIX_MATCHES = 3
+
+
+Locality = namedtuple('Locality', ['id', 'name', 'full_name', 'latitude', 'longitude', 'type'])
+
+
+def to_unit_vectors(latitudes, longitudes) -> np.ndarray:
+    """Points on the unit sphere, where straight-line (chord) distance orders the same as great-circle distance"""
+    lat = np.radians(np.asarray(latitudes, dtype=np.float64))
+    lng = np.radians(np.asarray(longitudes, dtype=np.float64))
+    return np.column_stack((np.cos(lat) * np.cos(lng), np.cos(lat) * np.sin(lng), np.sin(lat)))
+
+
+def chord_to_meters(chord: np.ndarray) -> np.ndarray:
+    return 2 * EARTH_RADIUS_M * np.arcsin(np.clip(chord / 2, 0, 1))
+
+
+class LocalityIndex:
+    """Maps a coordinate to the nearest neighborhoods and their city using KD-trees over the Localities centroids.
+
+    Built once at startup from the Localities table; rebuild it after indexing adds new localities.
+    """
+
+    def __init__(self, localities: list[Locality]):
+        self.neighborhoods = [locality for locality in localities if locality.type == 'neighborhood']
+        self.cities = [locality for locality in localities if locality.type == 'city']
+        self._neighborhood_tree = self._build_tree(self.neighborhoods)
+        self._city_tree = self._build_tree(self.cities)
+        self._cities_by_name = {city.name.lower(): city for city in self.cities}
+
+    @staticmethod
+    def _build_tree(localities: list[Locality]) -> cKDTree | None:
+        if not localities:
+            return None
+        return cKDTree(to_unit_vectors([locality.latitude for locality in localities],
+                                       [locality.longitude for locality in localities]))
+
+    @staticmethod
+    def _query(tree: cKDTree | None, localities: list[Locality], point: np.ndarray, k: int) -> list[tuple[Locality, float]]:
+        if tree is None:
+            return []
+        k = min(k, len(localities))
+        chords, indices = tree.query(point, k=k)
+        chords, indices = np.atleast_1d(chords), np.atleast_1d(indices)
+        return [(localities[i], float(distance)) for i, distance in zip(indices, chord_to_meters(chords))]
+
+    def _parent_city(self, neighborhood: Locality, point: np.ndarray) -> Locality | None:
+        # full names look like "Tribeca, New York, NY, USA"; boroughs like Brooklyn are not stored as cities
+        parts = [part.strip().lower() for part in (neighborhood.full_name or '').split(',')]
+        for part in parts[1:2]:
+            if part in self._cities_by_name:
+                return self._cities_by_name[part]
+        nearest = self._query(self._city_tree, self.cities, point, k=1)
+        return nearest[0][0] if nearest else None
+
+    def resolve(self, latitude: float, longitude: float, k: int = 3,
+                max_distance_m: float = MAX_NEIGHBORHOOD_DISTANCE_M) -> dict:
+        """The up to k nearest neighborhoods within max_distance_m of the coordinate, nearest first, and their parent city"""
+        point = to_unit_vectors([latitude], [longitude])[0]
+        neighborhoods = [(locality, distance) for locality, distance in self._query(self._neighborhood_tree, self.neighborhoods, point, k)
+                         if distance <= max_distance_m]
+
+        if neighborhoods:
+            city = self._parent_city(neighborhoods[0][0], point)
+        else:
+            city = next((city for city, distance in self._query(self._city_tree, self.cities, point, k=1)
+                         if distance <= MAX_CITY_DISTANCE_M), None)
+
+        return {
+            "neighborhoods": [{"id": locality.id, "name": locality.name, "distance_m": round(distance)}
+                              for locality, distance in neighborhoods],
+            "city": {"id": city.id, "name": city.name} if city else None,
+        }
+
+
+def normalize_locality_name(name: str) -> str:
+    """Lowercase, accents and apostrophes dropped, other punctuation as spaces: "Hell's Kitchen" -> 'hells kitchen'"""
+    name = unicodedata.normalize('NFKD', name).encode('ascii', 'ignore').decode('ascii').lower()
+    name = re.sub(r"['`]", '', name)
+    name = re.sub(r'[^a-z0-9]+', ' ', name).strip()
+    return LOCALITY_FILLER_WORDS.sub('', name).strip()
+
+
+def edit_distance(a: str, b: str, max_distance: int) -> int:
+    """Levenshtein distance, or max_distance + 1 once it is certain to exceed max_distance"""
+    if abs(len(a) - len(b)) > max_distance:
+        return max_distance + 1
+    previous = list(range(len(b) + 1))
+    for i, char_a in enumerate(a, start=1):
+        current = [i]
+        for j, char_b in enumerate(b, start=1):
+            current.append(min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + (char_a != char_b)))
+        if min(current) > max_distance:
+            return max_distance + 1
+        previous = current
+    return previous[-1]
+
+
+class LocalityResolver:
+    """Maps user phrases like "W'burg", "LES" or "Lower East Side" to locality ids without touching the database.
+
+    Phrases are normalized and looked up exactly among names and aliases, then as a specific enough prefix in a
+    trie, and finally by edit distance to catch typos. Built once at startup from the Localities table.
+    """
+
+    def __init__(self, localities: list[Locality]):
+        self.localities = {locality.id: locality for locality in localities}
+        self._ids_by_key = {}
+        for locality in localities:
+            key = normalize_locality_name(locality.name)
+            self._ids_by_key.setdefault(key, set()).add(locality.id)
+
+        # boroughs like Brooklyn are only part of full names ("Williamsburg, Brooklyn, NY, USA"), so they
+        # resolve to every neighborhood inside them
+        boroughs = {}
+        for locality in localities:
+            parts = (locality.full_name or '').split(',')
+            if locality.type == 'neighborhood' and len(parts) > 2:
+                borough = normalize_locality_name(parts[1])
+                names = [borough] + [name for name, city in BOROUGHS_NAMED_AFTER_CITY.items() if city == borough]
+                for name in names:
+                    if name and name not in self._ids_by_key:
+                        boroughs.setdefault(name, set()).add(locality.id)
+        self._ids_by_key.update(boroughs)
+
+        aliases = dict(LOCALITY_ALIASES)
+        for key in list(self._ids_by_key):
+            words = key.split()
+            if len(words) >= 3:
+                aliases.setdefault(''.join(word[0] for word in words), key)
+        for alias, key in aliases.items():
+            if key in self._ids_by_key and alias not in self._ids_by_key:
+                self._ids_by_key[alias] = self._ids_by_key[key]
+
+        # character trie over every name and alias; each node lists the keys below it
+        self._trie = {}
+        for key in self._ids_by_key:
+            node = self._trie
+            for char in key:
+                node = node.setdefault(char, {'keys': set()})
+                node['keys'].add(key)
+
+    def _prefix_matches(self, phrase: str) -> set[str]:
+        node = self._trie
+        for char in phrase:
+            if char not in node:
+                return set()
+            node = node[char]
+        return set().union(*(self._ids_by_key[key] for key in node['keys']))
+
+    def resolve(self, phrase: str) -> list[str]:
+        """Ids of the localities a phrase refers to, or an empty list when nothing is close enough"""
+        phrase = normalize_locality_name(phrase or '')
+        if not phrase:
+            return []
+        if phrase in self._ids_by_key:
+            return sorted(self._ids_by_key[phrase])
+
+        if len(phrase) >= MIN_PREFIX_LENGTH:
+            matches = self._prefix_matches(phrase)
+            if 0 < len(matches) <= MAX_PREFIX_MATCHES:
+                return sorted(matches)
+
+        # allow roughly one typo per four characters
+        max_distance = max(1, len(phrase) // 4)
+        best_distance, best = max_distance + 1, set()
+        for key, ids in self._ids_by_key.items():
+            distance = edit_distance(phrase, key, max_distance)
+            if distance < best_distance:
+                best_distance, best = distance, set(ids)
+            elif distance == best_distance and distance <= max_distance:
+                best |= ids
+        return sorted(best) if best_distance <= max_distance else []
+
+    def resolve_many(self, phrases: list[str]) -> list[str]:
+        return sorted({locality_id for phrase in phrases for locality_id in self.resolve(phrase)})
+
+    def names(self, locality_ids: list[str]) -> list[str]:
+        return [self.localities[locality_id].name for locality_id in locality_ids if locality_id in self.localities]
@@ -1,8 +1,13 @@
 from datetime import datetime, timedelta
+from contextlib import asynccontextmanager
 from simple_conversational_agent import SimpleConversationalRestaurantAgent
+from rate_limiter import RateLimiter
+from scheduler import AdmissionRejected, ChatScheduler, ScheduledStreamingResponse
 from fastapi import FastAPI, Request, HTTPException, Depends, Header
+from fastapi.responses import JSONResponse
 from pydantic import BaseModel
 import os
+import json
 import shutil
 import uuid
 import asyncio
@@ -11,7 +16,29 @@ from dotenv import load_dotenv
 
 load_dotenv()
 
-app = FastAPI(docs_url=None, redoc_url=None, openapi_url=None)
+# Readiness is reported separately from liveness so traffic only arrives once the models are warm
+readiness = {"ready": False, "error": None}
+
+
+async def warm_up_models():
+    try:
+        await asyncio.to_thread(agent.tools.warmup)
+        readiness["ready"] = True
+        print("Models warmed up, ready to serve")
+    except Exception as e:
+        readiness["error"] = str(e)
+        print(f"Error warming up models: {e}")
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # warm up in the background so the liveness probe answers while models load
+    warmup_task = asyncio.create_task(warm_up_models())
+    yield
+    warmup_task.cancel()
+
+
+app = FastAPI(docs_url=None, redoc_url=None, openapi_url=None, lifespan=lifespan)
 
 # Get database paths from environment variables
 DB_PATH = os.getenv("DB_PATH", "places.db")  # fallback for local development
@@ -40,7 +67,26 @@ def setup_persistent_databases():
 # Setup databases for Railway
 setup_persistent_databases()
 
-agent = SimpleConversationalRestaurantAgent(db_path=DB_PATH, chroma_path=CHROMA_PATH)
+# One OpenAI budget for every model and embedding call of this process, so bursts queue instead of hitting 429s
+openai_budget = RateLimiter(requests_per_minute=int(os.getenv("OPENAI_RPM", 500)),
+                            tokens_per_minute=int(os.getenv("OPENAI_TPM", 200_000)))
+
+agent = SimpleConversationalRestaurantAgent(db_path=DB_PATH, chroma_path=CHROMA_PATH, rate_limiter=openai_budget)
+
+scheduler = ChatScheduler(
+    openai_budget,
+    max_concurrent=int(os.getenv("CHAT_MAX_CONCURRENT", 8)),
+    max_queue=int(os.getenv("CHAT_MAX_QUEUE", 64)),
+    max_queue_per_session=int(os.getenv("CHAT_MAX_QUEUE_PER_SESSION", 16)),
+    max_wait_s=float(os.getenv("CHAT_MAX_WAIT_S", 30)),
+    tokens_per_chat=int(os.getenv("CHAT_TOKENS_ESTIMATE", 8_000))
+)
+
+
+@app.exception_handler(AdmissionRejected)
+async def admission_rejected(request: Request, exc: AdmissionRejected):
+    return JSONResponse(status_code=429, headers={"Retry-After": str(exc.retry_after)},
+                        content={"error": exc.reason, "retry_after": exc.retry_after})
 
 # Get API key from environment variable
 API_KEY = os.getenv("API_KEY")
@@ -96,8 +142,7 @@ def cleanup_old_sessions():
             print(f"Error cleaning up session {session_id}: {e}")
 
 
-@app.post("/chat")
-async def chat(request: ChatRequest, api_key: str = Depends(verify_api_key)):
+def start_session(request: ChatRequest) -> str:
     # Auto-create session if not provided
     if not request.session_id or request.session_id not in active_sessions:
         session_id = str(uuid.uuid4())
@@ -111,17 +156,53 @@ async def chat(request: ChatRequest, api_key: str = Depends(verify_api_key)):
     if len(active_sessions) % 50 == 0:
         cleanup_old_sessions()
 
-    try:
-        # Pass location context to agent if provided
-        location_context = request.location_context.model_dump() if request.location_context else None
-        response = await agent.chat(request.query, session_id=session_id, location_context=location_context)
-        return {
-            "response": response,
-            "session_id": session_id
-        }
-    except Exception as e:
-        print(f"Error in chat endpoint: {e}")
-        return {"error": f"Failed to process request: {str(e)}"}
+    return session_id
+
+
+def sse_event(event: str, data: dict) -> str:
+    return f"event: {event}\ndata: {json.dumps(data, default=str)}\n\n"
+
+
+@app.post("/chat")
+async def chat(request: ChatRequest, api_key: str = Depends(verify_api_key)):
+    session_id = start_session(request)
+
+    # waits for a free slot, or answers 429 with Retry-After when the server is saturated
+    async with scheduler.slot(session_id):
+        try:
+            # Pass location context to agent if provided
+            location_context = request.location_context.model_dump() if request.location_context else None
+            response = await agent.chat(request.query, session_id=session_id, location_context=location_context)
+            return {
+                "response": response,
+                "session_id": session_id
+            }
+        except Exception as e:
+            print(f"Error in chat endpoint: {e}")
+            return {"error": f"Failed to process request: {str(e)}"}
+
+
+@app.post("/chat/stream")
+async def chat_stream(request: ChatRequest, api_key: str = Depends(verify_api_key)):
+    """Server-sent events for one chat turn: session first, then plan, tool_start, tool_end and token events
+    as the agent works, ending with final (or error)"""
+    session_id = start_session(request)
+    location_context = request.location_context.model_dump() if request.location_context else None
+
+    async def events():
+        # sent before the agent starts so the client knows the session right away
+        yield sse_event("session", {"session_id": session_id})
+        async for event, data in agent.chat_stream(request.query, session_id=session_id, location_context=location_context):
+            if event == "final":
+                data["session_id"] = session_id
+            yield sse_event(event, data)
+
+    # admitted before the stream starts, so a saturated server can still answer with a plain 429;
+    # the response owns the slot from here and frees it however the stream ends
+    await scheduler.acquire(session_id)
+    # no-transform and X-Accel-Buffering keep proxies from holding events back until the response ends
+    return ScheduledStreamingResponse(events(), scheduler, media_type="text/event-stream",
+                                      headers={"Cache-Control": "no-cache, no-transform", "X-Accel-Buffering": "no"})
 
 
 @app.delete("/session/{session_id}")
@@ -138,7 +219,25 @@ async def end_session(session_id: str, api_key: str = Depends(verify_api_key)):
         return {"error": f"Failed to end session: {str(e)}"}
 
 
+@app.get("/metrics")
+async def metrics(api_key: str = Depends(verify_api_key)):
+    """LLM turns and tool calls per chat since the server started"""
+    return {**agent.metrics.snapshot(),
+            "response_cache": agent.response_cache.stats() if agent.response_cache else None,
+            "scheduler": scheduler.stats()}
+
+
 @app.get("/health")
+@app.get("/health/live")
 async def health_check():
-    """Health check endpoint - no authentication required"""
+    """Liveness check endpoint - no authentication required"""
     return {"status": "healthy", "message": "API is running"}
+
+
+@app.get("/health/ready")
+async def readiness_check():
+    """Readiness check endpoint - 503 until the search models are warm"""
+    if readiness["ready"]:
+        return {"status": "ready"}
+    return JSONResponse(status_code=503, content={"status": "warming_up" if not readiness["error"] else "failed",
+                                                  "error": readiness["error"]})
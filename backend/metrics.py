@@ -0,0 +1,50 @@
+import threading
+from collections import Counter
+
+from langchain_core.messages import AIMessage, BaseMessage, HumanMessage
+
+
+def chat_turn_counts(messages: list[BaseMessage]) -> dict:
+    """LLM turns and tool calls the agent made answering the last human message of a conversation"""
+    start = next((i + 1 for i in range(len(messages) - 1, -1, -1) if isinstance(messages[i], HumanMessage)), 0)
+    turns = [message for message in messages[start:] if isinstance(message, AIMessage)]
+    return {
+        "llm_turns": len(turns),
+        "tool_calls": sum(len(turn.tool_calls) for turn in turns),
+        # turns whose tool calls ran together in one step
+        "parallel_turns": sum(1 for turn in turns if len(turn.tool_calls) > 1),
+    }
+
+
+class ChatMetrics:
+    """Running counts of LLM turns per chat. Each extra turn is another model round trip, so this is the
+    number to watch when tuning the prompt and tool plan."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.chats = 0
+        self.llm_turns = 0
+        self.tool_calls = 0
+        self.parallel_turns = 0
+        self.cached_chats = 0
+        self.turns_histogram = Counter()
+
+    def record(self, llm_turns: int, tool_calls: int, parallel_turns: int, cached: bool = False):
+        with self._lock:
+            self.chats += 1
+            self.cached_chats += cached
+            self.llm_turns += llm_turns
+            self.tool_calls += tool_calls
+            self.parallel_turns += parallel_turns
+            self.turns_histogram[llm_turns] += 1
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            return {
+                "chats": self.chats,
+                "llm_turns_per_chat": round(self.llm_turns / self.chats, 2) if self.chats else None,
+                "tool_calls_per_chat": round(self.tool_calls / self.chats, 2) if self.chats else None,
+                "parallel_turns": self.parallel_turns,
+                "cached_chats": self.cached_chats,
+                "llm_turns_histogram": dict(sorted(self.turns_histogram.items())),
+            }
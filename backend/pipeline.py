@@ -0,0 +1,227 @@
+import argparse
+import asyncio
+import os
+import sqlite3
+
+import pandas as pd
+
+from cache import CACHE_PATH, SummaryCache
+from indexer import DOCUMENTS_PER_PLACE, EMBEDDING_BATCH_SIZE, OPENAI_API_KEY, IndexReport, Indexer
+from summarizer import PlaceSummarizer
+
+# marks the end of a stage's input, one per downstream worker
+DONE = object()
+
+
+class PipelineCheckpoint:
+    """Records which places each stage has finished for a source, so an interrupted run can resume.
+
+    Only meaningful until the run completes, which clears the source's checkpoints.
+    """
+
+    def __init__(self, db_path: str = CACHE_PATH):
+        self.conn = sqlite3.connect(db_path)
+        self.conn.execute("""
+            CREATE TABLE IF NOT EXISTS IndexCheckpoint (
+                source TEXT,
+                stage TEXT,
+                place_id TEXT,
+                PRIMARY KEY(source, stage, place_id)
+            ) WITHOUT ROWID
+        """)
+        self.conn.commit()
+
+    def completed(self, source: str, stage: str) -> set[str]:
+        rows = self.conn.execute("SELECT place_id FROM IndexCheckpoint WHERE source = ? AND stage = ?", (source, stage))
+        return {place_id for place_id, in rows}
+
+    def mark(self, source: str, stage: str, place_ids: list[str]):
+        with self.conn:
+            self.conn.executemany("INSERT OR IGNORE INTO IndexCheckpoint (source, stage, place_id) VALUES (?, ?, ?)",
+                                  [(source, stage, place_id) for place_id in place_ids])
+
+    def clear(self, source: str):
+        with self.conn:
+            self.conn.execute("DELETE FROM IndexCheckpoint WHERE source = ?", (source,))
+
+
+class IndexingPipeline:
+    """Streams a checkpoint CSV through parse -> SQLite save -> summarize -> embed -> Chroma upsert.
+
+    Stages are connected by bounded queues, so a slow stage holds back the ones feeding it instead of
+    rows piling up in memory, and the LLM and embedding stages overlap. SQLite and Chroma writes are
+    checkpointed per place. Summaries and embeddings are resumable through their caches.
+
+    Like Indexer.index_changes, rows are diffed against the stored index: only added or changed places go
+    through the pipeline, re-scraped but unchanged ones just get their SQLite row refreshed, and places that
+    vanished from the source are deleted once the run completes.
+    """
+
+    def __init__(self, indexer: Indexer, summary_workers: int = 8, embed_workers: int = 2,
+                 batch_size: int = EMBEDDING_BATCH_SIZE, queue_size: int = 4, checkpoint: PipelineCheckpoint = None):
+        self.indexer = indexer
+        self.summary_workers = summary_workers
+        self.embed_workers = embed_workers
+        self.batch_size = batch_size
+        self.places_per_batch = max(1, batch_size // DOCUMENTS_PER_PLACE)
+        self.queue_size = queue_size
+        self.checkpoint = checkpoint or PipelineCheckpoint()
+
+    async def run(self, csv_path: str, resume: bool = True) -> IndexReport:
+        source = os.path.basename(csv_path)
+        if not resume:
+            self.checkpoint.clear(source)
+
+        report = IndexReport()
+        stored = self.indexer.sqlite_store.get_index_state()
+        seen = set()
+        parsed = asyncio.Queue(maxsize=self.queue_size)
+        to_summarize = asyncio.Queue(maxsize=self.places_per_batch)
+        to_embed = asyncio.Queue(maxsize=self.places_per_batch * self.queue_size)
+        to_upsert = asyncio.Queue(maxsize=self.queue_size)
+
+        try:
+            async with asyncio.TaskGroup() as tg:
+                tg.create_task(self._parse(csv_path, source, stored, seen, parsed, report))
+                tg.create_task(self._save(source, parsed, to_summarize))
+                tg.create_task(self._run_workers(self.summary_workers, self._summarize, to_summarize, to_embed, self.embed_workers, report))
+                tg.create_task(self._embed(to_embed, to_upsert))
+                tg.create_task(self._upsert(source, to_upsert, report))
+        finally:
+            await self.indexer.chroma_store.summarizer.aclose()
+
+        report.deleted = self.indexer.vanished_places(stored, source, seen)
+        self.indexer.chroma_store.delete(report.deleted)
+        self.indexer.sqlite_store.delete(report.deleted)
+
+        self.indexer.sqlite_store.invalidate(report.failed)
+        # the run is complete, so the next one diffs against the stored index instead of skipping these places
+        self.checkpoint.clear(source)
+        self.indexer.sqlite_store.checkpoint()
+        print(f'Indexed {source}: {report.summary()}')
+        return report
+
+    async def _run_workers(self, count: int, worker, inbox: asyncio.Queue, outbox: asyncio.Queue, downstream: int, *args):
+        await asyncio.gather(*(worker(inbox, outbox, *args) for _ in range(count)))
+        for _ in range(downstream):
+            await outbox.put(DONE)
+
+    async def _parse(self, csv_path: str, source: str, stored: dict[str, tuple[str, str, str]], seen: set[str],
+                     outbox: asyncio.Queue, report: IndexReport):
+        # places an interrupted run of this source already finished, or saved without embedding them yet
+        indexed = self.checkpoint.completed(source, 'chroma')
+        saved = self.checkpoint.completed(source, 'sqlite')
+        # read the CSV a batch at a time so memory does not grow with the file
+        reader = pd.read_csv(csv_path, chunksize=self.places_per_batch)
+        while (chunk := await asyncio.to_thread(next, reader, None)) is not None:
+            places = []
+            refreshed = []
+            for _, row in chunk.iterrows():
+                place = self.indexer._create_place_from_csv_row(row)
+                seen.add(place.place_id)
+                if place.place_id in indexed:
+                    change = 'unchanged'
+                elif place.place_id in saved:
+                    # its stored hash is already the new one, so it can't be diffed
+                    change = 'updated'
+                else:
+                    change = self.indexer.diff_place(place, stored, source)
+
+                getattr(report, change).append(place.place_id)
+                if change in ('added', 'updated'):
+                    places.append(place)
+                elif change == 'refreshed':
+                    refreshed.append(place)
+
+            if refreshed:
+                self.indexer.sqlite_store.save_many(refreshed, source=source)
+            if places:
+                await outbox.put(places)
+        await outbox.put(DONE)
+
+    async def _save(self, source: str, inbox: asyncio.Queue, outbox: asyncio.Queue):
+        saved = self.checkpoint.completed(source, 'sqlite')
+        while (places := await inbox.get()) is not DONE:
+            unsaved = [place for place in places if place.place_id not in saved]
+            # one short local transaction per batch, cheap enough to run on the loop thread
+            self.indexer.sqlite_store.save_many(unsaved, source=source)
+            self.checkpoint.mark(source, 'sqlite', [place.place_id for place in unsaved])
+            for place in places:
+                await outbox.put(place)
+
+        for _ in range(self.summary_workers):
+            await outbox.put(DONE)
+
+    async def _summarize(self, inbox: asyncio.Queue, outbox: asyncio.Queue, report: IndexReport):
+        chroma_store = self.indexer.chroma_store
+        while (place := await inbox.get()) is not DONE:
+            summarized_data = await chroma_store.summarizer.asummarize(place)
+            try:
+                if isinstance(summarized_data, Exception):
+                    raise summarized_data
+                records = chroma_store.create_records(place, summarized_data)
+            except Exception as e:
+                print('Error summarizing place', place.place_id, e)
+                report.failed.append(place.place_id)
+                continue
+            await outbox.put((place.place_id, records))
+
+    async def _embed(self, inbox: asyncio.Queue, outbox: asyncio.Queue):
+        async def worker():
+            batch = []
+            document_count = 0
+            while (item := await inbox.get()) is not DONE:
+                batch.append(item)
+                document_count += len(item[1][1])
+                if document_count >= self.batch_size:
+                    await outbox.put(await self._embed_batch(batch))
+                    batch = []
+                    document_count = 0
+            if batch:
+                await outbox.put(await self._embed_batch(batch))
+
+        await asyncio.gather(*(worker() for _ in range(self.embed_workers)))
+        await outbox.put(DONE)
+
+    async def _embed_batch(self, batch: list) -> tuple:
+        place_ids = [place_id for place_id, _ in batch]
+        ids = [doc_id for _, (doc_ids, _, _) in batch for doc_id in doc_ids]
+        docs = [doc for _, (_, place_docs, _) in batch for doc in place_docs]
+        metadatas = [metadata for _, (_, _, place_metadatas) in batch for metadata in place_metadatas]
+        embeddings = await asyncio.to_thread(self.indexer.chroma_store.embedding_function, docs)
+        return place_ids, ids, docs, metadatas, embeddings
+
+    async def _upsert(self, source: str, inbox: asyncio.Queue, report: IndexReport):
+        collection = self.indexer.chroma_store.collection
+        while (item := await inbox.get()) is not DONE:
+            place_ids, ids, docs, metadatas, embeddings = item
+            await asyncio.to_thread(collection.upsert, ids=ids, embeddings=embeddings, documents=docs, metadatas=metadatas)
+            self.indexer.sqlite_store.bump_index_version()
+            self.checkpoint.mark(source, 'chroma', place_ids)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Stream place checkpoint CSVs into the SQLite and Chroma indexes')
+    parser.add_argument('csv_paths', nargs='+', help='place checkpoint CSVs produced by the scraper')
+    parser.add_argument('--db-path', default=os.getenv('DB_PATH', 'places.db'))
+    parser.add_argument('--chroma-path', default=os.getenv('CHROMA_PATH', 'places_vector_db'))
+    parser.add_argument('--cache-path', default=CACHE_PATH, help='summary/embedding cache and checkpoint database')
+    parser.add_argument('--summary-workers', type=int, default=8, help='concurrent LLM summarization requests')
+    parser.add_argument('--embed-workers', type=int, default=2, help='concurrent embedding requests')
+    parser.add_argument('--batch-size', type=int, default=EMBEDDING_BATCH_SIZE, help='documents per embedding request')
+    parser.add_argument('--queue-size', type=int, default=4, help='batches buffered between stages')
+    parser.add_argument('--restart', action='store_true', help='ignore checkpoints left by a previous run')
+    args = parser.parse_args()
+
+    summarizer = PlaceSummarizer(api_key=OPENAI_API_KEY, max_concurrency=args.summary_workers,
+                                 cache=SummaryCache(args.cache_path))
+    indexer = Indexer(db_path=args.db_path, chroma_path=args.chroma_path, summarizer=summarizer, cache_path=args.cache_path)
+    pipeline = IndexingPipeline(indexer, summary_workers=args.summary_workers, embed_workers=args.embed_workers,
+                                batch_size=args.batch_size, queue_size=args.queue_size,
+                                checkpoint=PipelineCheckpoint(args.cache_path))
+    for csv_path in args.csv_paths:
+        asyncio.run(pipeline.run(csv_path, resume=not args.restart))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,75 @@
+import asyncio
+import threading
+import time
+
+
+class RateLimiter:
+    """Token-bucket limiter for OpenAI requests per minute and tokens per minute.
+
+    One instance can be shared by coroutines on any event loop and by worker threads, so every OpenAI call
+    a process makes draws from the same budget.
+    """
+
+    def __init__(self, requests_per_minute: int, tokens_per_minute: int):
+        self.requests_per_minute = requests_per_minute
+        self.tokens_per_minute = tokens_per_minute
+        self._available_requests = float(requests_per_minute)
+        self._available_tokens = float(tokens_per_minute)
+        self._last_refill = time.monotonic()
+        self._state_lock = threading.Lock()
+        self._lock = None
+        self._lock_loop = None
+
+    def _get_lock(self) -> asyncio.Lock:
+        # asyncio locks are bound to one event loop, but the budget outlives asyncio.run calls
+        loop = asyncio.get_running_loop()
+        if self._lock_loop is not loop:
+            self._lock = asyncio.Lock()
+            self._lock_loop = loop
+        return self._lock
+
+    def _refill(self):
+        now = time.monotonic()
+        elapsed = now - self._last_refill
+        self._last_refill = now
+        self._available_requests = min(self.requests_per_minute,
+                                       self._available_requests + elapsed * self.requests_per_minute / 60)
+        self._available_tokens = min(self.tokens_per_minute,
+                                     self._available_tokens + elapsed * self.tokens_per_minute / 60)
+
+    def _wait(self, tokens: int) -> float:
+        return max(
+            (1 - self._available_requests) * 60 / self.requests_per_minute,
+            (tokens - self._available_tokens) * 60 / self.tokens_per_minute,
+            0
+        )
+
+    def _take(self, tokens: int) -> float:
+        """Spend the budget for one request if it's there, otherwise return the seconds until it will be"""
+        # a single request can never need more than a full minute of tokens
+        tokens = min(tokens, self.tokens_per_minute)
+        with self._state_lock:
+            self._refill()
+            wait = self._wait(tokens)
+            if wait == 0:
+                self._available_requests -= 1
+                self._available_tokens -= tokens
+            return wait
+
+    def wait_time(self, tokens: int = 0) -> float:
+        """Seconds until a request using the given number of tokens could start, without spending anything"""
+        with self._state_lock:
+            self._refill()
+            return self._wait(min(tokens, self.tokens_per_minute))
+
+    async def acquire(self, tokens: int = 0):
+        """Wait until there is budget for one request using the given number of tokens"""
+        # holding the lock while sleeping keeps waiters in FIFO order
+        async with self._get_lock():
+            while (wait := self._take(tokens)) > 0:
+                await asyncio.sleep(wait)
+
+    def acquire_blocking(self, tokens: int = 0):
+        """acquire for code running on worker threads rather than the event loop"""
+        while (wait := self._take(tokens)) > 0:
+            time.sleep(wait)
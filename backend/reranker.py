@@ -0,0 +1,245 @@
+import asyncio
+import os
+import queue
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future
+
+import numpy as np
+
+# a hub id, or a local directory holding the model files (the Docker image bakes them in)
+RERANKER_MODEL = os.getenv("RERANKER_MODEL", "cross-encoder/ms-marco-MiniLM-L-6-v2")
+
+# int8 export shipped in the model repo, runs on any x86-64 CPU with AVX2
+DEFAULT_ONNX_FILE = "onnx/model_quint8_avx2.onnx"
+
+
+class TorchReranker:
+    """CrossEncoder reranker on the default PyTorch backend"""
+
+    def __init__(self, model_name: str = RERANKER_MODEL, batch_size: int = 32, num_threads: int = None, max_length: int = 256):
+        import torch
+        from sentence_transformers import CrossEncoder
+
+        if num_threads:
+            torch.set_num_threads(num_threads)
+        self.batch_size = batch_size
+        self.model = CrossEncoder(model_name, max_length=max_length)
+
+    def predict(self, pairs: list[tuple[str, str]]) -> np.ndarray:
+        return self.model.predict(pairs, batch_size=self.batch_size, show_progress_bar=False)
+
+
+class OnnxReranker:
+    """CrossEncoder reranker on ONNX Runtime, with documents tokenized once and cached"""
+
+    def __init__(self, model_name: str = RERANKER_MODEL, onnx_file: str = DEFAULT_ONNX_FILE, batch_size: int = 32,
+                 num_threads: int = None, max_length: int = 256, token_cache_size: int = 10_000):
+        import onnxruntime as ort
+        from huggingface_hub import snapshot_download
+        from tokenizers import Tokenizer
+
+        model_dir = model_name if os.path.isdir(model_name) else snapshot_download(
+            model_name, allow_patterns=["tokenizer.json", onnx_file])
+        self.tokenizer = Tokenizer.from_file(os.path.join(model_dir, "tokenizer.json"))
+        self.tokenizer.no_truncation()
+        self.tokenizer.no_padding()
+        self.cls_id = self.tokenizer.token_to_id("[CLS]")
+        self.sep_id = self.tokenizer.token_to_id("[SEP]")
+        self.pad_id = self.tokenizer.token_to_id("[PAD]") or 0
+
+        options = ort.SessionOptions()
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        if num_threads:
+            options.intra_op_num_threads = num_threads
+            options.inter_op_num_threads = 1
+        self.session = ort.InferenceSession(os.path.join(model_dir, onnx_file), options, providers=["CPUExecutionProvider"])
+        self.input_names = {model_input.name for model_input in self.session.get_inputs()}
+
+        self.batch_size = batch_size
+        self.max_length = max_length
+        self.token_cache_size = token_cache_size
+        self._token_cache = OrderedDict()
+        self._token_cache_lock = threading.Lock()
+
+    def _document_tokens(self, documents: list[str]) -> list[list[int]]:
+        # the same place documents come back for many queries, so only tokenize them once
+        with self._token_cache_lock:
+            missing = [doc for doc in dict.fromkeys(documents) if doc not in self._token_cache]
+
+        encoded = self.tokenizer.encode_batch(missing, add_special_tokens=False) if missing else []
+
+        with self._token_cache_lock:
+            for doc, encoding in zip(missing, encoded):
+                self._token_cache[doc] = encoding.ids
+            tokens = []
+            for doc in documents:
+                self._token_cache.move_to_end(doc)
+                tokens.append(self._token_cache[doc])
+            while len(self._token_cache) > self.token_cache_size:
+                self._token_cache.popitem(last=False)
+        return tokens
+
+    def _encode_pair(self, query_ids: list[int], doc_ids: list[int]) -> tuple[list[int], list[int]]:
+        # [CLS] query [SEP] document [SEP], truncating the document first like the HF tokenizer does
+        budget = self.max_length - 3
+        query_ids = query_ids[:max(budget - len(doc_ids), budget // 2)]
+        doc_ids = doc_ids[:budget - len(query_ids)]
+        input_ids = [self.cls_id] + query_ids + [self.sep_id] + doc_ids + [self.sep_id]
+        token_type_ids = [0] * (len(query_ids) + 2) + [1] * (len(doc_ids) + 1)
+        return input_ids, token_type_ids
+
+    def predict(self, pairs: list[tuple[str, str]]) -> np.ndarray:
+        if not pairs:
+            return np.array([], dtype=np.float32)
+
+        queries = list(dict.fromkeys(query for query, _ in pairs))
+        query_tokens = {query: encoding.ids for query, encoding in
+                        zip(queries, self.tokenizer.encode_batch(queries, add_special_tokens=False))}
+        doc_tokens = self._document_tokens([doc for _, doc in pairs])
+
+        scores = []
+        for start in range(0, len(pairs), self.batch_size):
+            encoded = [self._encode_pair(query_tokens[query], doc_ids)
+                       for (query, _), doc_ids in zip(pairs[start:start + self.batch_size], doc_tokens[start:start + self.batch_size])]
+            width = max(len(input_ids) for input_ids, _ in encoded)
+
+            input_ids = np.full((len(encoded), width), self.pad_id, dtype=np.int64)
+            token_type_ids = np.zeros((len(encoded), width), dtype=np.int64)
+            attention_mask = np.zeros((len(encoded), width), dtype=np.int64)
+            for i, (ids, types) in enumerate(encoded):
+                input_ids[i, :len(ids)] = ids
+                token_type_ids[i, :len(types)] = types
+                attention_mask[i, :len(ids)] = 1
+
+            inputs = {"input_ids": input_ids, "attention_mask": attention_mask, "token_type_ids": token_type_ids}
+            logits = self.session.run(None, {name: value for name, value in inputs.items() if name in self.input_names})[0]
+            scores.append(logits.reshape(len(encoded), -1)[:, 0])
+
+        return np.concatenate(scores)
+
+
+class BatchingReranker:
+    """Scores rerank requests from concurrent searches together on a dedicated worker thread.
+
+    The worker waits up to batch_window_ms after the first request for others to arrive, then scores
+    up to max_batch_pairs pairs in one predict call. ONNX Runtime and PyTorch release the GIL while
+    running the model, so inference on this thread does not stall the FastAPI event loop.
+    """
+
+    def __init__(self, reranker, batch_window_ms: float = 5, max_batch_pairs: int = 128):
+        self.reranker = reranker
+        self.batch_window = batch_window_ms / 1000
+        self.max_batch_pairs = max_batch_pairs
+        self._requests = queue.Queue()
+        self._worker = threading.Thread(target=self._run, name="reranker", daemon=True)
+        self._worker.start()
+
+    def submit(self, pairs: list[tuple[str, str]]) -> Future:
+        future = Future()
+        if not pairs:
+            future.set_result(np.array([], dtype=np.float32))
+        else:
+            self._requests.put((pairs, future))
+        return future
+
+    def predict(self, pairs: list[tuple[str, str]]) -> np.ndarray:
+        return self.submit(pairs).result()
+
+    async def apredict(self, pairs: list[tuple[str, str]]) -> np.ndarray:
+        return await asyncio.wrap_future(self.submit(pairs))
+
+    def _collect_batch(self, carried: tuple) -> tuple[list[tuple], tuple]:
+        """Gather requests for one forward pass. Returns the batch and any request left for the next one."""
+        batch = [carried or self._requests.get()]
+        pair_count = len(batch[0][0])
+        deadline = time.monotonic() + self.batch_window
+        while pair_count < self.max_batch_pairs:
+            timeout = deadline - time.monotonic()
+            if timeout <= 0:
+                break
+            try:
+                request = self._requests.get(timeout=timeout)
+            except queue.Empty:
+                break
+            if pair_count + len(request[0]) > self.max_batch_pairs:
+                return batch, request
+            batch.append(request)
+            pair_count += len(request[0])
+        return batch, None
+
+    def _run(self):
+        carried = None
+        while True:
+            batch, carried = self._collect_batch(carried)
+            # callers that gave up while queued (e.g. a disconnected stream) are dropped; the rest can no longer
+            # be cancelled, so delivering their results below can't hit a cancelled future
+            batch = [(request_pairs, future) for request_pairs, future in batch if future.set_running_or_notify_cancel()]
+            if not batch:
+                continue
+            pairs = [pair for request_pairs, _ in batch for pair in request_pairs]
+            try:
+                scores = self.reranker.predict(pairs)
+            except Exception as e:
+                for _, future in batch:
+                    self._deliver(future.set_exception, e)
+                continue
+
+            start = 0
+            for request_pairs, future in batch:
+                self._deliver(future.set_result, scores[start:start + len(request_pairs)])
+                start += len(request_pairs)
+
+    @staticmethod
+    def _deliver(set_outcome, value):
+        # this is the only worker thread, one bad future must not end it
+        try:
+            set_outcome(value)
+        except Exception as e:
+            print(f"Failed to deliver rerank result: {e}")
+
+
+def load_reranker(backend: str = None, micro_batching: bool = True, **kwargs):
+    """Build the reranker configured by RERANKER_* environment variables, falling back to PyTorch"""
+    backend = backend or os.getenv("RERANKER_BACKEND", "onnx")
+    options = {
+        "batch_size": int(os.getenv("RERANKER_BATCH_SIZE", 32)),
+        "num_threads": int(os.getenv("RERANKER_THREADS", 0)) or None,
+        "max_length": int(os.getenv("RERANKER_MAX_LENGTH", 256)),
+    }
+    options.update(kwargs)
+
+    reranker = None
+    if backend == "onnx":
+        try:
+            reranker = OnnxReranker(onnx_file=os.getenv("RERANKER_ONNX_FILE", DEFAULT_ONNX_FILE), **options)
+        except Exception as e:
+            print(f"Failed to load ONNX reranker, falling back to PyTorch: {e}")
+    reranker = reranker or TorchReranker(**options)
+
+    batch_window_ms = float(os.getenv("RERANKER_BATCH_WINDOW_MS", 5))
+    if micro_batching and batch_window_ms > 0:
+        return BatchingReranker(reranker, batch_window_ms=batch_window_ms,
+                                max_batch_pairs=int(os.getenv("RERANKER_MAX_BATCH_PAIRS", 128)))
+    return reranker
+
+
+# Compare per-query rerank latency of the backends: python reranker.py
+if __name__ == "__main__":
+    query = "cozy coffee shop in Williamsburg where I can work"
+    documents = [
+        f"Cafe {i} is a coffee shop in Williamsburg, New York. It's described as a relaxed spot with plenty of "
+        f"seating, fast wifi and pastries baked in house. It's rated 4.{i % 10} out of 5 and has a price level of $$."
+        for i in range(20)
+    ]
+    pairs = [(query, doc) for doc in documents]
+
+    for backend in ["torch", "onnx"]:
+        reranker = load_reranker(backend, micro_batching=False)
+        reranker.predict(pairs)  # warm up
+        runs = 20
+        start = time.perf_counter()
+        for _ in range(runs):
+            reranker.predict(pairs)
+        print(f"{type(reranker).__name__}: {(time.perf_counter() - start) / runs * 1000:.1f} ms per query of {len(pairs)} pairs")
@@ -0,0 +1,94 @@
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+
+import numpy as np
+
+# about 1 km of latitude; openers asked within the same cell share answers
+LOCATION_BUCKET_DEGREES = 0.01
+
+
+def location_bucket(location_context: dict | None) -> tuple[int, int] | None:
+    """Coarse grid cell of the user's coordinates, or None without a location"""
+    if not location_context or location_context.get('latitude') is None or location_context.get('longitude') is None:
+        return None
+    return (int(np.floor(location_context['latitude'] / LOCATION_BUCKET_DEGREES)),
+            int(np.floor(location_context['longitude'] / LOCATION_BUCKET_DEGREES)))
+
+
+@dataclass
+class CachedResponse:
+    query: str
+    embedding: np.ndarray
+    location_bucket: tuple[int, int] | None
+    response: dict
+    created_at: float
+
+
+class SemanticResponseCache:
+    """In-memory cache of first-turn answers, matched by query embedding similarity.
+
+    Entries only match queries from the same location bucket, and the whole cache is dropped as soon as the
+    index version changes, so answers never outlive the data they were built from. Expired entries are
+    skipped and the least recently used entry is evicted once max_entries is reached.
+    """
+
+    def __init__(self, threshold: float = 0.95, ttl_seconds: float = 3600, max_entries: int = 1000):
+        self.threshold = threshold
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._index_version = None
+        self._next_id = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def _unit(embedding) -> np.ndarray:
+        embedding = np.asarray(embedding, dtype=np.float32)
+        return embedding / (np.linalg.norm(embedding) or 1)
+
+    def _check_version(self, index_version: str):
+        if index_version != self._index_version:
+            self._entries.clear()
+            self._index_version = index_version
+
+    def get(self, embedding, bucket: tuple[int, int] | None, index_version: str) -> dict | None:
+        """The cached response of the most similar query at or above the threshold, or None"""
+        embedding = self._unit(embedding)
+        now = time.monotonic()
+        with self._lock:
+            self._check_version(index_version)
+            for entry_id in [entry_id for entry_id, entry in self._entries.items() if now - entry.created_at > self.ttl_seconds]:
+                del self._entries[entry_id]
+
+            candidates = [(entry_id, entry) for entry_id, entry in self._entries.items() if entry.location_bucket == bucket]
+            if candidates:
+                similarities = np.stack([entry.embedding for _, entry in candidates]) @ embedding
+                best = int(np.argmax(similarities))
+                if similarities[best] >= self.threshold:
+                    entry_id, entry = candidates[best]
+                    self._entries.move_to_end(entry_id)
+                    self.hits += 1
+                    return entry.response
+
+            self.misses += 1
+            return None
+
+    def put(self, query: str, embedding, bucket: tuple[int, int] | None, index_version: str, response: dict):
+        with self._lock:
+            self._check_version(index_version)
+            self._entries[self._next_id] = CachedResponse(query, self._unit(embedding), bucket, response, time.monotonic())
+            self._next_id += 1
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"entries": len(self._entries), "hits": self.hits, "misses": self.misses}
@@ -0,0 +1,158 @@
+import asyncio
+import math
+import time
+from collections import OrderedDict, deque
+from contextlib import asynccontextmanager
+
+from langchain_core.callbacks import AsyncCallbackHandler
+from starlette.responses import StreamingResponse
+
+from rate_limiter import RateLimiter
+from summarizer import estimate_tokens
+
+# reserved per chat model call on top of the prompt, the answer is rarely longer
+LLM_MAX_OUTPUT_TOKENS = 1_500
+
+
+class AdmissionRejected(Exception):
+    """A chat was turned away instead of queued; retry_after is the suggested wait in whole seconds"""
+
+    def __init__(self, reason: str, retry_after: float):
+        super().__init__(reason)
+        self.reason = reason
+        self.retry_after = max(1, math.ceil(retry_after))
+
+
+class OpenAIBudgetCallback(AsyncCallbackHandler):
+    """Makes every chat model call wait for its share of the OpenAI budget before it is sent"""
+
+    def __init__(self, rate_limiter: RateLimiter, max_output_tokens: int = LLM_MAX_OUTPUT_TOKENS):
+        self.rate_limiter = rate_limiter
+        self.max_output_tokens = max_output_tokens
+
+    async def on_chat_model_start(self, serialized, messages, **kwargs):
+        for prompt in messages:
+            text = ''.join(str(message.content) for message in prompt)
+            await self.rate_limiter.acquire(estimate_tokens(text) + self.max_output_tokens)
+
+
+class ChatScheduler:
+    """Admission control in front of the agent.
+
+    At most max_concurrent chats run at once. Later ones wait in a bounded queue with one FIFO per chat
+    session, and freed slots go to the sessions in turn, so one busy conversation can't starve the others.
+    Every client shares the same API key, so the session is the finest grain requests can be told apart by.
+    A chat is rejected with a retry hint when the queue (or its session's share of it) is full, when it
+    waited longer than max_wait_s, or when the shared OpenAI budget couldn't start it within max_wait_s anyway.
+    """
+
+    def __init__(self, rate_limiter: RateLimiter, max_concurrent: int = 8, max_queue: int = 64,
+                 max_queue_per_session: int = 16, max_wait_s: float = 30, tokens_per_chat: int = 8_000):
+        self.rate_limiter = rate_limiter
+        self.max_concurrent = max_concurrent
+        self.max_queue = max_queue
+        self.max_queue_per_session = max_queue_per_session
+        self.max_wait_s = max_wait_s
+        self.tokens_per_chat = tokens_per_chat
+        self.running = 0
+        self.queued = 0
+        self.rejected = 0
+        self._waiting = OrderedDict()  # session id -> deque of futures, in the order sessions get served
+        # moving average of how long a chat holds its slot, to estimate queue waits
+        self._chat_seconds = 10.0
+
+    def _retry_after(self, queue_position: int) -> float:
+        queue_wait = queue_position / self.max_concurrent * self._chat_seconds
+        return max(queue_wait, self.rate_limiter.wait_time(self.tokens_per_chat))
+
+    def _reject(self, reason: str, retry_after: float):
+        self.rejected += 1
+        raise AdmissionRejected(reason, retry_after)
+
+    async def acquire(self, session_id: str):
+        """Wait for a slot to run one chat, or raise AdmissionRejected"""
+        budget_wait = self.rate_limiter.wait_time(self.tokens_per_chat)
+        if budget_wait > self.max_wait_s:
+            self._reject("OpenAI rate limit budget exhausted", budget_wait)
+
+        if self.running < self.max_concurrent and not self.queued:
+            self.running += 1
+            return
+        if self.queued >= self.max_queue:
+            self._reject("Too many requests queued", self._retry_after(self.queued + 1))
+        if len(self._waiting.get(session_id, ())) >= self.max_queue_per_session:
+            self._reject("Too many requests queued for this session", self._retry_after(self.queued + 1))
+
+        future = asyncio.get_running_loop().create_future()
+        self._waiting.setdefault(session_id, deque()).append(future)
+        self.queued += 1
+        try:
+            await asyncio.wait_for(asyncio.shield(future), timeout=self.max_wait_s)
+        except (asyncio.TimeoutError, asyncio.CancelledError) as e:
+            if future.done():
+                # the slot was handed over as the wait ended, give it to the next chat
+                self.release()
+            else:
+                future.cancel()
+                self._remove_waiter(session_id, future)
+            if isinstance(e, asyncio.TimeoutError):
+                self._reject("Timed out waiting in the request queue", self._retry_after(self.queued + 1))
+            raise
+
+    def _remove_waiter(self, session_id: str, future: asyncio.Future):
+        waiters = self._waiting.get(session_id)
+        if waiters and future in waiters:
+            waiters.remove(future)
+            self.queued -= 1
+            if not waiters:
+                del self._waiting[session_id]
+
+    def release(self, chat_seconds: float = None):
+        """Free the slot of a finished chat and hand it to the next session in turn"""
+        if chat_seconds is not None:
+            self._chat_seconds = 0.9 * self._chat_seconds + 0.1 * chat_seconds
+        self.running -= 1
+        while self._waiting and self.running < self.max_concurrent:
+            session_id, waiters = next(iter(self._waiting.items()))
+            future = waiters.popleft()
+            self.queued -= 1
+            # the served session goes to the back of the line
+            if waiters:
+                self._waiting.move_to_end(session_id)
+            else:
+                del self._waiting[session_id]
+            if not future.done():
+                future.set_result(None)
+                self.running += 1
+
+    @asynccontextmanager
+    async def slot(self, session_id: str):
+        await self.acquire(session_id)
+        started = time.monotonic()
+        try:
+            yield
+        finally:
+            self.release(time.monotonic() - started)
+
+    def stats(self) -> dict:
+        return {"running": self.running, "queued": self.queued, "rejected": self.rejected,
+                "avg_chat_seconds": round(self._chat_seconds, 2)}
+
+
+class ScheduledStreamingResponse(StreamingResponse):
+    """StreamingResponse that holds a scheduler slot acquired for it and releases it however the response ends.
+
+    Releasing in the body generator is not enough: when the client disconnects before the response starts,
+    the generator never runs and its cleanup with it.
+    """
+
+    def __init__(self, content, scheduler: ChatScheduler, **kwargs):
+        super().__init__(content, **kwargs)
+        self.scheduler = scheduler
+        self.started = time.monotonic()
+
+    async def __call__(self, scope, receive, send):
+        try:
+            await super().__call__(scope, receive, send)
+        finally:
+            self.scheduler.release(time.monotonic() - self.started)
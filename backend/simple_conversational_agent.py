@@ -1,10 +1,15 @@
+import ast
+import asyncio
 import json
+import time
 import numpy as np
-from typing import Dict, List
-import sqlite3
+from typing import AsyncIterator, Dict, List, Optional, Tuple
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
 
 from langchain_openai import ChatOpenAI
-from langchain_core.messages import HumanMessage, SystemMessage
+from langchain_core.messages import AIMessage, HumanMessage, SystemMessage, ToolMessage
+from langchain_core.tools import StructuredTool
 from langchain_community.utilities.sql_database import SQLDatabase
 from langchain_community.agent_toolkits.sql.toolkit import SQLDatabaseToolkit
 from langchain_community.agent_toolkits.sql.base import create_sql_agent
@@ -14,12 +19,22 @@ from langgraph.checkpoint.memory import MemorySaver
 from dotenv import load_dotenv
 import os
 
-from indexer import ChromaStore, SQLiteStore
+from indexer import ChromaStore, SQLiteStore, build_where
+from localities import LocalityIndex, LocalityResolver
+from db_pool import ReadConnectionPool
+from metrics import ChatMetrics, chat_turn_counts
+from response_cache import SemanticResponseCache, location_bucket
+from rate_limiter import RateLimiter
+from scheduler import OpenAIBudgetCallback
 
 load_dotenv()
 OPENAI_API_KEY = os.getenv('OPENAI_API_KEY')
 
 
+# standard reciprocal rank fusion constant, damps the influence of the very top ranks
+RRF_K = 60
+
+
 def safe_json_serialize(obj):
     """Safely serialize objects to JSON, handling numpy types"""
     if isinstance(obj, (np.integer, np.floating)):
@@ -34,43 +49,151 @@ def safe_json_serialize(obj):
         return obj
 
 
+def build_react_agent(llm, tools: list, checkpointer=None):
+    """ReAct agent over the tools that runs every tool call of a model turn concurrently"""
+    # Let the model request several independent tools in one turn; the tool node runs all calls of a
+    # turn concurrently and hands every result back in the same step, saving a model round trip each
+    model = llm.bind_tools(tools, parallel_tool_calls=True).with_config({"tags": ["restaurant_agent"]})
+    return create_react_agent(model=model, tools=tools, checkpointer=checkpointer)
+
+
 class RestaurantSearchTools:
     """Enhanced search tools for conversational restaurant recommendations"""
 
-    def __init__(self, db_path: str = 'places.db', chroma_path: str = 'places_vector_db'):
-        self.sqlite_store = SQLiteStore(db_path)
-        self.chroma_store = ChromaStore(chroma_path)
+    def __init__(self, db_path: str = 'places.db', chroma_path: str = 'places_vector_db', rate_limiter: RateLimiter = None):
+        # concurrent tool calls each read through their own thread's connection
+        read_pool = ReadConnectionPool(db_path, in_memory=os.getenv('SQLITE_IN_MEMORY', 'false').lower() == 'true')
+        self.sqlite_store = SQLiteStore(db_path, read_pool=read_pool)
+        self.chroma_store = ChromaStore(chroma_path, rate_limiter=rate_limiter)
+        localities = self.sqlite_store.get_localities()
+        self.locality_index = LocalityIndex(localities)
+        self.locality_resolver = LocalityResolver(localities)
 
         # SQL agent for complex queries
         self.db = SQLDatabase.from_uri(f"sqlite:///{db_path}")
-        self.llm_mini = ChatOpenAI(model="gpt-4o-mini", temperature=0.3, api_key=OPENAI_API_KEY)
+        self.llm_mini = ChatOpenAI(model="gpt-4o-mini", temperature=0.3, api_key=OPENAI_API_KEY,
+                                   callbacks=[OpenAIBudgetCallback(rate_limiter)] if rate_limiter else None)
         self.sql_toolkit = SQLDatabaseToolkit(db=self.db, llm=self.llm_mini)
         self.sql_agent = create_sql_agent(
             llm=self.llm_mini,
             toolkit=self.sql_toolkit,
             agent_type="openai-tools"
         )
-        self.db_conn = sqlite3.connect(db_path)
+        # sized pools for blocking work, so concurrent sessions overlap their retrieval without unbounded threads;
+        # the SQLite pool size also caps how many read connections the pool opens
+        self.search_executor = ThreadPoolExecutor(max_workers=int(os.getenv("SEARCH_WORKERS", 8)), thread_name_prefix="search")
+        self.db_executor = ThreadPoolExecutor(max_workers=int(os.getenv("SQLITE_WORKERS", 4)), thread_name_prefix="sqlite")
+
+    def warmup(self):
+        """Load the search models so the first user query doesn't pay for it"""
+        self.chroma_store.warmup()
+
+    def vector_search(self, query: str, n_places: int = 7, category: Optional[List[str]] = None, max_price: Optional[int] = None,
+                      min_rating: Optional[float] = None, open_only: bool = False, localities: Optional[List[str]] = None,
+                      locality_ids: Optional[List[str]] = None) -> List[Dict]:
+        """Search for restaurants using semantic similarity. Best for atmosphere, vibe, and qualitative features. Returns n_places distinct places.
+        Optional hard filters are applied inside the search: category, matched loosely like constraint_search (e.g. ['italian'], ['sushi'], ['coffee shop']), max_price (dollars per person),
+        min_rating (0-5), open_only (skip permanently closed places), localities (neighborhood, borough or city names and nicknames, e.g. ['Williamsburg', 'LES'])
+        and locality_ids (ids of the user's resolved neighborhoods, when given in the location context)."""
+        try:
+            where = self._vector_search_where(category, max_price, min_rating, open_only, localities, locality_ids)
+            results = self.chroma_store.search_places(query, k=n_places, rerank=True, where=where)
+            return self._format_vector_results(results)
 
-    def vector_search(self, query: str, n_results: int = 20) -> List[Dict]:
-        """Search for restaurants using semantic similarity. Best for atmosphere, vibe, and qualitative features."""
+        except LookupError as e:
+            return [{"error": str(e)}]
+        except Exception as e:
+            return [{"error": f"Vector search failed: {str(e)}"}]
+
+    def _resolve_localities(self, localities: Optional[List[str]], locality_ids: Optional[List[str]]) -> Optional[List[str]]:
+        if not localities:
+            return locality_ids
+        named_ids = self.locality_resolver.resolve_many(localities)
+        if not named_ids:
+            raise LookupError(f"No saved places in {', '.join(localities)}")
+        return (locality_ids or []) + named_ids
+
+    def _vector_search_where(self, category, max_price, min_rating, open_only, localities, locality_ids) -> Optional[Dict]:
+        return build_where(category=category, price_max=max_price, min_rating=min_rating, open_only=open_only,
+                           locality_ids=self._resolve_localities(localities, locality_ids))
+
+    def _format_vector_results(self, results: List[Dict]) -> List[Dict]:
+        formatted_results = []
+        for place in results:
+            formatted_results.append({
+                "name": place["name"],
+                "id": place["id"],
+                "relevance_score": round(float(place["score"]), 3),
+                "matched_content": place["documents"]
+            })
+
+        return formatted_results
+
+    def hybrid_search(self, query: str, n_places: int = 10) -> List[Dict]:
+        """Search for restaurants by keywords and meaning at once. Best for dish names, specific terms ("omakase", "natural wine") or exact place names, optionally mixed with a vibe."""
         try:
-            results = self.chroma_store.search(query, n_results=n_results, rerank=True)
+            # the keyword and semantic searches run concurrently and are merged by reciprocal rank fusion
+            lexical = self.db_executor.submit(self.sqlite_store.search_text, query, n_places * 2)
+            semantic = self.search_executor.submit(self.chroma_store.search_places, query, k=n_places * 2, rerank=False)
+            return self._fuse_ranks(lexical.result(), semantic.result(), n_places)
 
-            formatted_results = []
-            for score, name, doc_type, place_id, document in results:
-                formatted_results.append({
-                    "name": name,
-                    "id": place_id,
-                    "relevance_score": round(float(score), 3),
-                    "content_type": doc_type,
-                    "description": document
-                })
+        except Exception as e:
+            return [{"error": f"Hybrid search failed: {str(e)}"}]
+
+    def _fuse_ranks(self, lexical_results: List[Dict], semantic_results: List[Dict], n_places: int) -> List[Dict]:
+        fused = {}
+        for source, results in (("keyword_rank", lexical_results), ("semantic_rank", semantic_results)):
+            for rank, result in enumerate(results, start=1):
+                place = fused.setdefault(result["id"], {"name": result["name"], "id": result["id"], "rrf_score": 0.0})
+                place["rrf_score"] += 1 / (RRF_K + rank)
+                place[source] = rank
+                if "snippet" in result:
+                    place["keyword_match"] = result["snippet"]
+                if "documents" in result:
+                    place["matched_content"] = result["documents"]
+
+        ranked = sorted(fused.values(), key=lambda place: place["rrf_score"], reverse=True)[:n_places]
+        for place in ranked:
+            place["rrf_score"] = round(place["rrf_score"], 4)
+        return ranked
+
+    def nearby_search(self, latitude: float, longitude: float, radius_m: Optional[float] = None, k: int = 10,
+                      category: Optional[List[str]] = None, price_min: Optional[int] = None, price_max: Optional[int] = None,
+                      min_rating: Optional[float] = None, open_only: bool = True) -> List[Dict]:
+        """Find the saved places closest to a coordinate, nearest first, with their distance in meters. Best for "near me" / "nearby" requests.
+        Without radius_m it returns the k nearest places; with it, only places within that many meters.
+        Optional filters work like constraint_search: category (e.g. ['coffee shop']), price_min / price_max (per-person budget in dollars),
+        min_rating (0-5), open_only."""
+        try:
+            results = self.sqlite_store.nearby(latitude, longitude, radius_m=radius_m, k=k, category=category, price_min=price_min,
+                                               price_max=price_max, min_rating=min_rating, open_only=open_only)
+            return results or [{"error": "No saved places found near that location"}]
 
-            return formatted_results
+        except Exception as e:
+            return [{"error": f"Nearby search failed: {str(e)}"}]
+
+    def resolve_location(self, latitude: float, longitude: float) -> Dict:
+        """Nearest neighborhoods (within walking distance) and city for a GPS coordinate"""
+        return self.locality_index.resolve(latitude, longitude)
+
+    def constraint_search(self, category: Optional[List[str]] = None, price_min: Optional[int] = None, price_max: Optional[int] = None,
+                          min_rating: Optional[float] = None, localities: Optional[List[str]] = None,
+                          locality_ids: Optional[List[str]] = None, open_only: bool = True, limit: int = 20) -> List[Dict]:
+        """Find places by hard constraints only, best rated first. Best for cuisine/category, price, rating and neighborhood lookups.
+        category: cuisine or place types, matched loosely (e.g. ['italian'], ['coffee shop', 'cafe'], ['bar']).
+        price_min / price_max: per-person budget in dollars ("cheap" ~ price_max=15, "under $30" = price_max=30, "splurge" ~ price_min=75).
+        min_rating: 0-5. localities: neighborhood, borough or city names and nicknames (e.g. ['East Village', 'Williamsburg', 'LES']).
+        locality_ids: ids of the user's resolved neighborhoods, when given in the location context. open_only: skip permanently closed places."""
+        try:
+            results = self.sqlite_store.find_places(category=category, price_min=price_min, price_max=price_max,
+                                                    min_rating=min_rating, locality_ids=self._resolve_localities(localities, locality_ids),
+                                                    open_only=open_only, limit=limit)
+            return results or [{"error": "No saved places match all of these constraints"}]
 
+        except LookupError as e:
+            return [{"error": str(e)}]
         except Exception as e:
-            return [{"error": f"Vector search failed: {str(e)}"}]
+            return [{"error": f"Constraint search failed: {str(e)}"}]
 
     def sql_search(self, query_description: str) -> List[Dict]:
         """Search using SQL for specific constraints like location, price, cuisine, rating."""
@@ -114,88 +237,150 @@ EXECUTE the query and return the actual results, not just the SQL code.
     def get_restaurant_details(self, place_id: str) -> Dict:
         """Get detailed information about a specific restaurant."""
         try:
-            cursor = self.db_conn.cursor()
-
-            cursor.execute("""
-                SELECT p.name, p.rating, p.price_level, p.category, p.formatted_address, 
-                       p.description, p.reviews_json, p.atmosphere_json,
-                       GROUP_CONCAT(l.name || ' (' || l.type || ')') as localities
-                FROM Places p
-                LEFT JOIN PlaceLocalities pl ON p.id = pl.place_id
-                LEFT JOIN Localities l ON pl.locality_id = l.id
-                WHERE p.id = ?
-                GROUP BY p.id
-            """, (place_id,))
-
-            result = cursor.fetchone()
-
-            if result:
-                return {
-                    "name": result[0],
-                    "rating": result[1],
-                    "price_level": result[2],
-                    "category": result[3],
-                    "address": result[4],
-                    "description": result[5],
-                    "reviews": json.loads(result[6]) if result[6] else [],
-                    "atmosphere": json.loads(result[7]) if result[7] else [],
-                    "neighborhoods": result[8] if result[8] else "Location data unavailable"
-                }
-            else:
+            details = self.sqlite_store.get_place_details(place_id)
+            if details is None:
                 return {"error": "Restaurant not found"}
 
+            localities = details.pop("localities")
+            details["neighborhoods"] = localities if localities else "Location data unavailable"
+            return details
+
         except Exception as e:
             return {"error": f"Database query failed: {str(e)}"}
 
     def validate_location_match(self, place_ids: List[str], target_location: str) -> Dict:
         """Validate if a restaurant matches the target location."""
         try:
-            cursor = self.db_conn.cursor()
-            # Build query with multiple place IDs
-            place_ids_str = ','.join(['?' for _ in place_ids])
-            cursor.execute(f"""
-                SELECT p.id, p.name, l.name, l.full_name, l.type
-                FROM Places p
-                JOIN PlaceLocalities pl ON p.id = pl.place_id
-                JOIN Localities l ON pl.locality_id = l.id
-                WHERE p.id IN ({place_ids_str})
-            """, place_ids)
-
-            results = cursor.fetchall()
+            target_ids = set(self.locality_resolver.resolve(target_location))
+            if not target_ids:
+                return {"error": f"Unknown location: {target_location}"}
+
+            results = self.sqlite_store.get_place_localities(place_ids)
 
             if not results:
                 return {"error": "No restaurants found or no locality data available"}
 
-            target_lower = target_location.lower()
             restaurants_data = {}
 
             # Group results by restaurant
-            for place_id, rest_name, locality_name, locality_full_name, locality_type in results:
-                if (target_lower in locality_name.lower() or target_lower in locality_full_name.lower()):
-                    if place_id not in restaurants_data:
-                        restaurants_data[place_id] = {
-                            "restaurant_name": rest_name,
-                            "matching_localities": [],
-                            "all_localities": [],
-                            "target_location": target_location
-                        }
-
-                    restaurants_data[place_id]["all_localities"].append(f"{locality_name} ({locality_type})")
+            for place_id, rest_name, locality_id, locality_name, locality_type in results:
+                if place_id not in restaurants_data:
+                    restaurants_data[place_id] = {
+                        "restaurant_name": rest_name,
+                        "matching_localities": [],
+                        "all_localities": [],
+                        "target_location": target_location
+                    }
+
+                restaurants_data[place_id]["all_localities"].append(f"{locality_name} ({locality_type})")
+                if locality_id in target_ids:
                     restaurants_data[place_id]["matching_localities"].append(locality_name)
 
             return {
-                "restaurants": list(restaurants_data.values()),
-                "target_location": target_location
+                "restaurants": [data for data in restaurants_data.values() if data["matching_localities"]],
+                "non_matching_restaurants": [data["restaurant_name"] for data in restaurants_data.values() if not data["matching_localities"]],
+                "target_location": target_location,
+                "resolved_localities": self.locality_resolver.names(sorted(target_ids))
             }
 
         except Exception as e:
             return {"error": f"Location validation failed: {str(e)}"}
+    # Async versions of the tools for the agent. Blocking SQLite and vector work runs on the sized executors
+    # and reranking awaits the reranker's own worker, so a slow search never stalls the event loop.
+
+    async def avector_search(self, query: str, n_places: int = 7, category: Optional[List[str]] = None, max_price: Optional[int] = None,
+                             min_rating: Optional[float] = None, open_only: bool = False, localities: Optional[List[str]] = None,
+                             locality_ids: Optional[List[str]] = None) -> List[Dict]:
+        try:
+            where = self._vector_search_where(category, max_price, min_rating, open_only, localities, locality_ids)
+            results = await self.chroma_store.asearch_places(query, k=n_places, rerank=True, where=where,
+                                                             executor=self.search_executor)
+            return self._format_vector_results(results)
+
+        except LookupError as e:
+            return [{"error": str(e)}]
+        except Exception as e:
+            return [{"error": f"Vector search failed: {str(e)}"}]
+
+    async def ahybrid_search(self, query: str, n_places: int = 10) -> List[Dict]:
+        try:
+            loop = asyncio.get_running_loop()
+            lexical_results, semantic_results = await asyncio.gather(
+                loop.run_in_executor(self.db_executor, self.sqlite_store.search_text, query, n_places * 2),
+                self.chroma_store.asearch_places(query, k=n_places * 2, rerank=False, executor=self.search_executor)
+            )
+            return self._fuse_ranks(lexical_results, semantic_results, n_places)
+
+        except Exception as e:
+            return [{"error": f"Hybrid search failed: {str(e)}"}]
+
+    async def _run_db(self, tool, *args, **kwargs):
+        # the SQLite-only tools are fast, they just mustn't run on the event loop thread
+        return await asyncio.get_running_loop().run_in_executor(self.db_executor, partial(tool, *args, **kwargs))
+
+    async def anearby_search(self, *args, **kwargs) -> List[Dict]:
+        return await self._run_db(self.nearby_search, *args, **kwargs)
+
+    async def aconstraint_search(self, *args, **kwargs) -> List[Dict]:
+        return await self._run_db(self.constraint_search, *args, **kwargs)
+
+    async def aget_restaurant_details(self, *args, **kwargs) -> Dict:
+        return await self._run_db(self.get_restaurant_details, *args, **kwargs)
+
+    async def avalidate_location_match(self, *args, **kwargs) -> Dict:
+        return await self._run_db(self.validate_location_match, *args, **kwargs)
+
+    def agent_tools(self) -> List[StructuredTool]:
+        """The search tools with their sync and async implementations; the agent awaits the async ones"""
+        implementations = [
+            (self.vector_search, self.avector_search),
+            (self.hybrid_search, self.ahybrid_search),
+            (self.nearby_search, self.anearby_search),
+            (self.constraint_search, self.aconstraint_search),
+            (self.get_restaurant_details, self.aget_restaurant_details),
+            (self.validate_location_match, self.avalidate_location_match),
+        ]
+        return [StructuredTool.from_function(func=func, coroutine=coroutine, name=func.__name__)
+                for func, coroutine in implementations]
+
+
+def _tool_result_places(message: ToolMessage) -> List[Dict]:
+    # tools return dicts or lists of dicts, which reach the message as content blocks or their repr
+    content = message.content
+    if isinstance(content, str):
+        try:
+            content = ast.literal_eval(content)
+        except (ValueError, SyntaxError):
+            try:
+                content = json.loads(content)
+            except ValueError:
+                return []
+    if isinstance(content, dict):
+        content = content.get("restaurants", [content])
+    if not isinstance(content, list):
+        return []
+    return [item for item in content if isinstance(item, dict) and item.get("id") and item.get("name")]
+
+
+def recommended_places(messages: list, response: str) -> List[Dict]:
+    """Places from this turn's tool results that the answer mentions by name, in the order it mentions them"""
+    start = next((i + 1 for i in range(len(messages) - 1, -1, -1) if isinstance(messages[i], HumanMessage)), 0)
+    places = {}
+    for message in messages[start:]:
+        if isinstance(message, ToolMessage):
+            for place in _tool_result_places(message):
+                places.setdefault(place["name"], place["id"])
+
+    mentioned = [(response.find(name), name) for name in places if name in response]
+    return [{"id": places[name], "name": name} for _, name in sorted(mentioned)]
 
 
 class SimpleConversationalRestaurantAgent:
     """Simple conversational restaurant agent using LangGraph's built-in memory"""
 
-    def __init__(self, db_path: str = 'places.db', chroma_path: str = 'places_vector_db', debug: bool = False):
+    def __init__(self, db_path: str = 'places.db', chroma_path: str = 'places_vector_db', debug: bool = False,
+                 rate_limiter: RateLimiter = None):
+        """rate_limiter is the OpenAI budget every model and embedding call waits on, shared with the rest of the process"""
         self.debug = debug
 
         # Use LangGraph's built-in memory for conversation persistence
@@ -204,55 +389,58 @@ class SimpleConversationalRestaurantAgent:
         self.llm = ChatOpenAI(
             model="gpt-5-mini",
             temperature=0.7,
-            api_key=OPENAI_API_KEY
+            api_key=OPENAI_API_KEY,
+            callbacks=[OpenAIBudgetCallback(rate_limiter)] if rate_limiter else None
         )
-        self.tools = RestaurantSearchTools(db_path=db_path, chroma_path=chroma_path)
+        self.tools = RestaurantSearchTools(db_path=db_path, chroma_path=chroma_path, rate_limiter=rate_limiter)
+        self.metrics = ChatMetrics()
         self.agent = self._build_agent()
 
+        # opt-in: near-duplicate opening questions are answered from memory instead of running the agent
+        self.response_cache = None
+        if os.getenv("RESPONSE_CACHE", "false").lower() == "true":
+            self.response_cache = SemanticResponseCache(
+                threshold=float(os.getenv("RESPONSE_CACHE_THRESHOLD", 0.95)),
+                ttl_seconds=float(os.getenv("RESPONSE_CACHE_TTL_S", 3600)),
+                max_entries=int(os.getenv("RESPONSE_CACHE_SIZE", 1000))
+            )
+
     def _build_agent(self):
         """Build the conversational agent with memory"""
 
-        # Create react agent with built-in conversation memory
-        agent = create_react_agent(
-            model=self.llm.with_config({"tags": ["restaurant_agent"]}),
-            tools=[
-                self.tools.vector_search,
-                # self.tools.sql_search,
-                self.tools.get_restaurant_details,
-                self.tools.validate_location_match
-            ] + self.tools.sql_toolkit.get_tools(),
-            checkpointer=self.memory  # This enables conversation memory
-        )
-
-        return agent
-
-    async def chat(self, user_input: str, session_id: str = "default", location_context: dict = None) -> str:
-        """Chat with the agent, maintaining conversation history"""
-        try:
-            if self.debug:
-                print(f"🗣️ User: {user_input}")
-
-            # Check if this is the first message in the conversation
-            current_state = await self.agent.aget_state(config={"configurable": {"thread_id": session_id}})
-            messages = current_state.values.get("messages", [])
-
-            # Add system message if this is the first interaction
-            if not messages:
-                # Build location context message if available
-                location_info = ""
-                if location_context and location_context.get('latitude') and location_context.get('longitude'):
-                    location_info = f"""
+        tools = self.tools.agent_tools() + self.tools.sql_toolkit.get_tools()
+        # the checkpointer enables conversation memory
+        return build_react_agent(self.llm, tools, checkpointer=self.memory)
+
+    async def _turn_input(self, user_input: str, session_id: str, location_context: dict = None) -> dict:
+        """The agent input for one chat turn, with the system prompt in front of the first message of a conversation"""
+        # Check if this is the first message in the conversation
+        current_state = await self.agent.aget_state(config={"configurable": {"thread_id": session_id}})
+
+        # Later turns rely on LangGraph's built-in conversation memory
+        if current_state.values.get("messages"):
+            return {"messages": [HumanMessage(content=user_input)]}
+
+        # Build location context message if available
+        location_info = ""
+        if location_context and location_context.get('latitude') and location_context.get('longitude'):
+            resolved = self.tools.resolve_location(location_context['latitude'], location_context['longitude'])
+            neighborhoods = ", ".join(f"{n['name']} (id: {n['id']}, {n['distance_m']} m away)" for n in resolved["neighborhoods"])
+            city = f"{resolved['city']['name']} (id: {resolved['city']['id']})" if resolved["city"] else "unknown"
+            location_info = f"""
 USER'S CURRENT LOCATION CONTEXT:
 - Latitude: {location_context['latitude']}
 - Longitude: {location_context['longitude']}
 - Accuracy: {location_context.get('accuracy', 'unknown')} meters
+- Nearest neighborhoods: {neighborhoods or 'none of the saved neighborhoods are close by'}
+- City: {city}
 
 IMPORTANT: Only use this location context when the user's query is VAGUE about location (e.g., "find me a restaurant", "good coffee shop nearby", "where should I eat?"). 
 If the user specifies a specific location in their query (e.g., "in Williamsburg", "near Times Square"), always prioritize their specified location over the GPS coordinates.
-When using GPS coordinates, find nearby neighborhoods and search for restaurants in those areas.
+When using GPS coordinates, call nearby_search with them directly, or pass the nearest neighborhood ids above as vector_search locality_ids. Don't guess neighborhood names.
 """
 
-                system_prompt = f"""
+        system_prompt = f"""
 You are an expert conversational restaurant recommendation assistant with perfect memory and access to indexed restaurant data. Users describe the vibe/atmosphere they want and often specify locations, price ranges, or cuisine types.
 Users will often ask in an iterative manner over a course of multiple messages and your ability to maintain context is critical. In your response, don't talk about our internal database or how you queried it or any errors you got. You can be vague
 but don't be detailed to the actual implementation details.
@@ -260,23 +448,22 @@ but don't be detailed to the actual implementation details.
 
 TOOL USAGE STRATEGY:
 1. **vector_search**: Use for qualitative queries (atmosphere, vibe, "cozy", "romantic", "good for work")
-2. **sql_search**: Use for specific constraints:
-    - Neighborhoods: "in East Village", "Williamsburg area", "near Union Square"
-    - Price ranges: "cheap", "expensive", "$$ level", "under $20"
-    - Ratings: "highly rated", "4+ stars"
-    - Cuisine: "Italian", "sushi", "coffee shops"
-    - Use OR to get more options unless the user really stresses that they want to have hard constraints.
-    - Use CASE-INSENSITIVE matching for location names (LOWER() function)
-    - For price filters, map natural language to actual price_level values
-    - Categories: 'Italian restaurant', 'Coffee shop', 'Bar', 'Japanese restaurant', 'French restaurant'
-    - Price levels: '$', '$$', '$$$', '$1-10', '$10-20', '$20-30', '$30-50', '$50-100', '$100+'
-    - Localities: 'East Village' (neighborhood), 'Williamsburg' (neighborhood), 'Tribeca' (neighborhood), 'New York' (city)
-3. **validate_location_match**: Use to verify if places actually match the user's location constraint
-4. **get_restaurant_details**: Use to get full info about specific places from other searches
+    - Pass hard constraints as filters (localities, category, max_price, min_rating, open_only) so every result already satisfies them, instead of validating afterwards
+2. **hybrid_search**: Use when the query names specific dishes, drinks, terms or places ("omakase", "natural wine", "Sushi Noz"), alone or with a vibe. One call covers both keyword and semantic matching
+3. **nearby_search**: Use for "near me", "nearby" or "around here" requests when the user's location is known. Pass radius_m for walking-distance requests (~1000)
+4. **constraint_search**: Use for specific constraints, alone or to complement vector_search:
+    - Neighborhoods: "in East Village", "Williamsburg area" -> localities
+    - Price ranges: "cheap", "expensive", "under $20" -> price_min / price_max in dollars per person
+    - Ratings: "highly rated", "4+ stars" -> min_rating
+    - Cuisine: "Italian", "sushi", "coffee shops" -> category
+    - Pass several categories or localities to get more options unless the user really stresses hard constraints
+    - Only fall back to the SQL database tools for questions constraint_search can't express (counts, comparisons, unusual columns)
+5. **validate_location_match**: Use to verify if places actually match the user's location constraint
+6. **get_restaurant_details**: Use to get full info about specific places from other searches
 
 RECOMMENDED APPROACH:
 1. Perform intent analysis to determine if the user is asking for a restaurant, bar, coffee shop, etc. If the request is not related to the conversation or to the purpose of your usage then respond with a message that you are not able to help with that.
-2. Perform both sql_search and vector_search to get comprehensive results
+2. Perform both constraint_search and vector_search to get comprehensive results, requesting them together in the same turn
 3. VALIDATE each result against user constraints:
     - Location: Does the address/neighborhood actually match what they asked for?
     - Category: Is it actually the type of place they want (coffee shop, restaurant, etc.)?
@@ -285,6 +472,7 @@ RECOMMENDED APPROACH:
 5. If few/no quality results remain, BE HONEST about data limitations
 
 Try to respond to the user's query as fast as possible so produce the fastest and and most relevant tool plan rather than going back and forth on tool usage.
+Tool calls you request in the same turn run in parallel, so always request independent searches together instead of one per turn. Only wait for results when the next call needs them (e.g. get_restaurant_details on ids a search returned).
 
 QUALITY CONTROL:
 - If a result doesn't match the location constraint, EXCLUDE it
@@ -339,27 +527,73 @@ User Query: "I want to find a sushi restaurant for a romantic date night"
 
 You can make multiple tool calls, analyze results, and make additional calls as needed.
 """
+        return {"messages": [SystemMessage(content=system_prompt), HumanMessage(content=user_input)]}
 
-                result = await self.agent.ainvoke(
-                    {"messages": [
-                        SystemMessage(content=system_prompt),
-                        HumanMessage(content=user_input)
-                    ]},
-                    config={"configurable": {"thread_id": session_id}}
-                )
-            else:
-                # Use LangGraph's built-in conversation memory
-                result = await self.agent.ainvoke(
-                    {"messages": [HumanMessage(content=user_input)]},
-                    config={"configurable": {"thread_id": session_id}}
-                )
+    async def _response_cache_key(self, user_input: str, location_context: dict, agent_input: dict) -> Optional[tuple]:
+        """(query embedding, location bucket, index version) for the first turn of a conversation, or None when
+        the response cache is off or this is a follow-up that depends on earlier messages"""
+        if self.response_cache is None or not isinstance(agent_input["messages"][0], SystemMessage):
+            return None
+        try:
+            loop = asyncio.get_running_loop()
+            embeddings, index_version = await asyncio.gather(
+                loop.run_in_executor(self.tools.search_executor, self.tools.chroma_store.embedding_function, [user_input]),
+                loop.run_in_executor(self.tools.db_executor, self.tools.sqlite_store.index_version)
+            )
+            return embeddings[0], location_bucket(location_context), index_version
+        except Exception as e:
+            # a cache problem shouldn't fail the chat, just skip the cache
+            if self.debug:
+                print(f"❌ Response cache unavailable: {e}")
+            return None
+
+    async def _cached_response(self, session_id: str, agent_input: dict, cache_key: tuple) -> Optional[Dict]:
+        cached = self.response_cache.get(*cache_key)
+        if cached is None:
+            return None
+
+        # seed the conversation as if the agent had answered, so follow-up questions keep their context
+        await self.agent.aupdate_state(
+            config={"configurable": {"thread_id": session_id}},
+            values={"messages": agent_input["messages"] + [AIMessage(content=cached["response"])]},
+            as_node="agent"
+        )
+        self.metrics.record(llm_turns=0, tool_calls=0, parallel_turns=0, cached=True)
+        return cached
+
+    async def chat(self, user_input: str, session_id: str = "default", location_context: dict = None) -> str:
+        """Chat with the agent, maintaining conversation history"""
+        try:
+            if self.debug:
+                print(f"🗣️ User: {user_input}")
+
+            agent_input = await self._turn_input(user_input, session_id, location_context)
+            cache_key = await self._response_cache_key(user_input, location_context, agent_input)
+            cached = cache_key and await self._cached_response(session_id, agent_input, cache_key)
+            if cached:
+                if self.debug:
+                    print("⚡ Answered from the response cache")
+                return cached["response"]
+
+            result = await self.agent.ainvoke(
+                agent_input,
+                config={"configurable": {"thread_id": session_id}}
+            )
+
+            turn_counts = chat_turn_counts(result["messages"])
+            self.metrics.record(**turn_counts)
 
             # Extract the final response
             final_message = result["messages"][-1]
             response = final_message.content if hasattr(final_message, 'content') else str(final_message)
 
+            if cache_key:
+                self.response_cache.put(user_input, *cache_key, {"response": response,
+                                                                 "places": recommended_places(result["messages"], response)})
+
             if self.debug:
                 print(f"🤖 Agent: {response[:100]}...")
+                print(f"🔁 {turn_counts['llm_turns']} LLM turns, {turn_counts['tool_calls']} tool calls")
 
             return response
 
@@ -369,6 +603,69 @@ You can make multiple tool calls, analyze results, and make additional calls as
                 print(f"❌ Error: {error_msg}")
             return error_msg
 
+    async def chat_stream(self, user_input: str, session_id: str = "default",
+                          location_context: dict = None) -> AsyncIterator[Tuple[str, Dict]]:
+        """Chat with the agent, yielding (event, data) pairs while the turn runs instead of only the final answer.
+
+        Events: plan when the model requests tools, tool_start/tool_end around each call, token for each piece
+        of the answer as the model writes it, and final with the whole answer and the places it recommends,
+        or error. Every event carries elapsed_ms since the turn started.
+        """
+        config = {"configurable": {"thread_id": session_id}}
+        started = time.perf_counter()
+        tool_starts = {}
+
+        def elapsed_ms(since: float = started) -> int:
+            return round((time.perf_counter() - since) * 1000)
+
+        try:
+            agent_input = await self._turn_input(user_input, session_id, location_context)
+            cache_key = await self._response_cache_key(user_input, location_context, agent_input)
+            cached = cache_key and await self._cached_response(session_id, agent_input, cache_key)
+            if cached:
+                yield "final", {**cached, "cached": True, "elapsed_ms": elapsed_ms(),
+                                "llm_turns": 0, "tool_calls": 0, "parallel_turns": 0}
+                return
+
+            async for event in self.agent.astream_events(agent_input, config=config, version="v2"):
+                kind = event["event"]
+                # the SQL toolkit's query checker runs its own model, only the agent's turns are streamed
+                is_agent_model = "restaurant_agent" in event.get("tags", [])
+
+                if kind == "on_chat_model_stream" and is_agent_model:
+                    content = event["data"]["chunk"].content
+                    if content and isinstance(content, str):
+                        yield "token", {"content": content, "elapsed_ms": elapsed_ms()}
+                elif kind == "on_chat_model_end" and is_agent_model:
+                    tool_calls = getattr(event["data"].get("output"), "tool_calls", None)
+                    if tool_calls:
+                        yield "plan", {"tools": [{"name": call["name"], "args": call["args"]} for call in tool_calls],
+                                       "elapsed_ms": elapsed_ms()}
+                elif kind == "on_tool_start":
+                    tool_starts[event["run_id"]] = time.perf_counter()
+                    yield "tool_start", {"id": event["run_id"], "name": event["name"],
+                                         "input": event["data"].get("input"), "elapsed_ms": elapsed_ms()}
+                elif kind == "on_tool_end":
+                    tool_started = tool_starts.pop(event["run_id"], started)
+                    yield "tool_end", {"id": event["run_id"], "name": event["name"],
+                                       "duration_ms": elapsed_ms(tool_started), "elapsed_ms": elapsed_ms()}
+
+            messages = (await self.agent.aget_state(config=config)).values.get("messages", [])
+            turn_counts = chat_turn_counts(messages)
+            self.metrics.record(**turn_counts)
+
+            response = messages[-1].content if messages else ""
+            places = recommended_places(messages, response)
+            if cache_key:
+                self.response_cache.put(user_input, *cache_key, {"response": response, "places": places})
+            yield "final", {"response": response, "places": places, "cached": False, "elapsed_ms": elapsed_ms(), **turn_counts}
+
+        except Exception as e:
+            error_msg = f"Error processing your request: {str(e)}"
+            if self.debug:
+                print(f"❌ Error: {error_msg}")
+            yield "error", {"error": error_msg, "elapsed_ms": elapsed_ms()}
+
     async def get_conversation_history(self, session_id: str = "default") -> List[Dict]:
         """Get the conversation history for a session"""
         try:
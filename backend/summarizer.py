@@ -0,0 +1,157 @@
+import asyncio
+import json
+import random
+
+import openai
+from openai import AsyncOpenAI
+
+from cache import SummaryCache
+from model import Place
+from rate_limiter import RateLimiter
+
+SUMMARY_MODEL = "gpt-5-mini"  # cheaper/faster for batch processing
+
+# rough upper bound on the JSON we ask for, used to reserve tokens-per-minute budget
+SUMMARY_MAX_OUTPUT_TOKENS = 300
+
+RETRYABLE_ERRORS = (
+    openai.RateLimitError,
+    openai.APITimeoutError,
+    openai.APIConnectionError,
+    openai.InternalServerError,
+)
+
+
+def build_summary_prompt(place: Place) -> str:
+    return f"""\n
+You are extracting semantic descriptions for a venue to improve search and recommendations.
+\n
+Given the following data for a place:
+Name: {place.name}
+Category: {place.category}
+Atmosphere tags: {place.atmosphere}
+Place types: {place.place_types}
+Description: {place.description}
+Reviews: {place.reviews}
+\n
+Produce a JSON object with the following fields:
+- atmosphere: A short (1-2 sentence) natural language description of the venue's vibe, crowd, and setting.
+- food_drink: A short (1-2 sentence) natural language description of the notable food and drink offerings.
+- special_features: A short (1 sentence) list of distinctive features, amenities, or quirks of the venue.
+\n
+Focus on what would help a user choose this place for a specific mood or occasion.
+\n
+Return the JSON object only, no other text.
+"""
+
+
+def estimate_tokens(text: str) -> int:
+    # ~4 characters per token for English text
+    return len(text) // 4 + 1
+
+
+class PlaceSummarizer:
+    """Summarizes places with the LLM concurrently, within OpenAI rate limits"""
+
+    def __init__(self, api_key: str, model: str = SUMMARY_MODEL, max_concurrency: int = 8,
+                 requests_per_minute: int = 500, tokens_per_minute: int = 200_000, max_retries: int = 5,
+                 rate_limiter: RateLimiter = None, cache: SummaryCache = None):
+        self.api_key = api_key
+        self.model = model
+        self.max_concurrency = max_concurrency
+        self.max_retries = max_retries
+        self.rate_limiter = rate_limiter or RateLimiter(requests_per_minute, tokens_per_minute)
+        self.cache = cache
+        self._client = None
+        self._semaphore = None
+        self._loop = None
+
+    def _get_client(self) -> tuple[AsyncOpenAI, asyncio.Semaphore]:
+        # the async client and semaphore are bound to the running loop, so recreate them per loop
+        loop = asyncio.get_running_loop()
+        if self._loop is not loop:
+            self._client = AsyncOpenAI(api_key=self.api_key, max_retries=0)
+            self._semaphore = asyncio.Semaphore(self.max_concurrency)
+            self._loop = loop
+        return self._client, self._semaphore
+
+    async def aclose(self):
+        if self._client is not None:
+            await self._client.close()
+        self._client = None
+        self._semaphore = None
+        self._loop = None
+
+    async def _summarize(self, client: AsyncOpenAI, semaphore: asyncio.Semaphore, prompt: str) -> dict:
+        tokens = estimate_tokens(prompt) + SUMMARY_MAX_OUTPUT_TOKENS
+
+        async with semaphore:
+            for attempt in range(self.max_retries + 1):
+                await self.rate_limiter.acquire(tokens)
+                try:
+                    response = await client.chat.completions.create(
+                        model=self.model,
+                        response_format={"type": "json_object"},
+                        messages=[
+                            {"role": "system", "content": "You are a helpful assistant for summarizing venue details."},
+                            {"role": "user", "content": prompt}
+                        ],
+                        temperature=0.3
+                    )
+                    return json.loads(response.choices[0].message.content)
+                except RETRYABLE_ERRORS as e:
+                    if attempt == self.max_retries:
+                        raise
+                    await asyncio.sleep(self._retry_delay(e, attempt))
+
+    def _retry_delay(self, error: Exception, attempt: int) -> float:
+        # prefer the server's hint on 429s, otherwise exponential backoff with jitter
+        response = getattr(error, 'response', None)
+        retry_after = response.headers.get('retry-after') if response is not None else None
+        if retry_after:
+            try:
+                return float(retry_after)
+            except ValueError:
+                pass
+        return min(60, 2 ** attempt) + random.random()
+
+    async def asummarize_many(self, places: list[Place]) -> list[dict | Exception]:
+        """Summarize places concurrently. Failed places get their exception in place of a summary."""
+        prompts = [build_summary_prompt(place) for place in places]
+        keys = [SummaryCache.make_key(self.model, prompt) for prompt in prompts]
+        cached = self.cache.get_many(keys) if self.cache else {}
+
+        # only places whose prompt inputs changed since the last run go to the LLM
+        misses = [i for i, key in enumerate(keys) if key not in cached]
+        results = [cached.get(key) for key in keys]
+        if not misses:
+            return results
+
+        client, semaphore = self._get_client()
+        summaries = await asyncio.gather(
+            *(self._summarize(client, semaphore, prompts[i]) for i in misses),
+            return_exceptions=True
+        )
+
+        for i, summary in zip(misses, summaries):
+            results[i] = summary
+
+        if self.cache:
+            self.cache.put_many(self.model, {
+                keys[i]: summary for i, summary in zip(misses, summaries)
+                if not isinstance(summary, Exception)
+            })
+        return results
+
+    async def asummarize(self, place: Place) -> dict | Exception:
+        return (await self.asummarize_many([place]))[0]
+
+    def summarize_many(self, places: list[Place]) -> list[dict | Exception]:
+        """Blocking wrapper around asummarize_many for the indexing scripts"""
+        async def run():
+            try:
+                return await self.asummarize_many(places)
+            finally:
+                await self.aclose()
+
+        return asyncio.run(run())
@@ -0,0 +1,56 @@
+import asyncio
+import os
+
+from langchain_core.language_models.fake_chat_models import GenericFakeChatModel
+from langchain_core.messages import AIMessage, HumanMessage
+from langchain_core.tools import StructuredTool
+from langchain_core.utils.function_calling import convert_to_openai_tool
+
+os.environ.setdefault("OPENAI_API_KEY", "test-key")
+
+from metrics import chat_turn_counts  # noqa: E402
+from simple_conversational_agent import build_react_agent  # noqa: E402
+
+
+class FakeToolCallingModel(GenericFakeChatModel):
+    """Replays scripted messages and records how tools were bound, like ChatOpenAI.bind_tools"""
+    bind_kwargs: dict = {}
+
+    def bind_tools(self, tools, **kwargs):
+        self.bind_kwargs = kwargs
+        return self.bind(tools=[convert_to_openai_tool(tool) for tool in tools], **kwargs)
+
+
+def test_tool_calls_of_one_turn_run_concurrently():
+    async def run():
+        # each search only finishes once the other has started, so running them one after the other would hang
+        vector_started, constraint_started = asyncio.Event(), asyncio.Event()
+
+        async def vector_search(query: str) -> list:
+            vector_started.set()
+            await constraint_started.wait()
+            return [{"id": "vector"}]
+
+        async def constraint_search(category: str) -> list:
+            constraint_started.set()
+            await vector_started.wait()
+            return [{"id": "constraint"}]
+
+        tools = [StructuredTool.from_function(coroutine=vector_search, name="vector_search", description="vibe search"),
+                 StructuredTool.from_function(coroutine=constraint_search, name="constraint_search", description="filters")]
+        model = FakeToolCallingModel(messages=iter([
+            AIMessage(content="", tool_calls=[
+                {"name": "vector_search", "args": {"query": "cozy"}, "id": "call_vector"},
+                {"name": "constraint_search", "args": {"category": "cafe"}, "id": "call_constraint"},
+            ]),
+            AIMessage(content="Here are two cozy cafes"),
+        ]))
+
+        agent = build_react_agent(model, tools)
+        result = await asyncio.wait_for(agent.ainvoke({"messages": [HumanMessage(content="cozy cafe")]}), timeout=5)
+        return model, result["messages"]
+
+    model, messages = asyncio.run(run())
+    assert model.bind_kwargs == {"parallel_tool_calls": True}
+    assert chat_turn_counts(messages) == {"llm_turns": 2, "tool_calls": 2, "parallel_turns": 1}
+    assert messages[-1].content == "Here are two cozy cafes"
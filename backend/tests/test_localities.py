@@ -0,0 +1,16 @@
+from localities import Locality, LocalityResolver
+
+LOCALITIES = [
+    Locality("nyc", "New York", "New York, NY, USA", 40.71, -74.01, "city"),
+    Locality("tribeca", "Tribeca", "Tribeca, New York, NY, USA", 40.72, -74.01, "neighborhood"),
+    Locality("les", "Lower East Side", "Lower East Side, New York, NY, USA", 40.72, -73.99, "neighborhood"),
+    Locality("wburg", "Williamsburg", "Williamsburg, Brooklyn, NY, USA", 40.71, -73.96, "neighborhood"),
+    Locality("astoria", "Astoria", "Astoria, Queens, NY, USA", 40.76, -73.92, "neighborhood"),
+]
+
+
+def test_boroughs_resolve_to_their_neighborhoods():
+    resolver = LocalityResolver(LOCALITIES)
+    assert resolver.resolve("Manhattan") == ["les", "tribeca"]
+    assert resolver.resolve("brooklyn") == ["wburg"]
+    assert resolver.resolve("NYC") == ["nyc"]
@@ -0,0 +1,40 @@
+import os
+import sqlite3
+
+import pytest
+
+os.environ.setdefault("OPENAI_API_KEY", "test-key")
+
+from indexer import SQLiteStore  # noqa: E402
+
+
+def index_names(db_path: str) -> set[str]:
+    with sqlite3.connect(db_path) as conn:
+        return {name for (name,) in conn.execute("SELECT name FROM sqlite_master WHERE type = 'index'")}
+
+
+def test_failed_migration_rolls_back_with_its_version(tmp_path, monkeypatch):
+    db_path = str(tmp_path / "places.db")
+    store = SQLiteStore(db_path)
+    latest = store.schema_version
+    # step back to before the price index migration, the ones after it are safe to re-run
+    step = [migration.__name__ for migration in store._migrations()].index("_create_price_indexes")
+    store.conn.execute("DROP INDEX idx_places_price_range")
+    store.conn.execute("DROP INDEX idx_places_category_price")
+    store.conn.execute(f"PRAGMA user_version = {step}")
+    store.conn.close()
+
+    create_price_indexes = SQLiteStore._create_price_indexes
+
+    def fail_halfway(self):
+        create_price_indexes(self)
+        raise RuntimeError("interrupted")
+
+    monkeypatch.setattr(SQLiteStore, "_create_price_indexes", fail_halfway)
+    with pytest.raises(RuntimeError, match="interrupted"):
+        SQLiteStore(db_path)
+    assert "idx_places_price_range" not in index_names(db_path)
+
+    monkeypatch.setattr(SQLiteStore, "_create_price_indexes", create_price_indexes)
+    assert SQLiteStore(db_path).schema_version == latest
+    assert "idx_places_price_range" in index_names(db_path)
@@ -0,0 +1,84 @@
+import asyncio
+import json
+import os
+
+import numpy as np
+import pandas as pd
+
+# the Chroma embedding function wants a key at construction, the test never calls OpenAI
+os.environ.setdefault("OPENAI_API_KEY", "test-key")
+
+from indexer import Indexer  # noqa: E402
+from pipeline import IndexingPipeline, PipelineCheckpoint  # noqa: E402
+
+
+class FakeSummarizer:
+    async def asummarize(self, place):
+        return {"atmosphere": f"{place.name} atmosphere", "food_drink": f"{place.name} menu",
+                "special_features": f"{place.name} features"}
+
+    async def aclose(self):
+        pass
+
+
+def fake_embeddings(docs: list[str]) -> list[np.ndarray]:
+    return [np.full(8, len(doc) % 7 + 1, dtype=np.float32) for doc in docs]
+
+
+def place_row(place_id: str, name: str, description: str, last_scraped: str) -> dict:
+    return {
+        "name": name, "source_url": f"https://maps.example/{place_id}", "place_id": place_id,
+        "business_status": "OPERATIONAL", "formatted_address": "1 Main St, New York, NY", "lat": 40.7, "lng": -73.9,
+        "place_types": json.dumps(["restaurant"]), "rating": 4.5, "price_level": "$$", "category": "Italian restaurant",
+        "description": description, "reviews": json.dumps([]), "atmosphere": json.dumps([]),
+        "last_scraped": last_scraped, "geocode_neighbourhoods": json.dumps(json.dumps([])),
+    }
+
+
+def make_pipeline(tmp_path) -> IndexingPipeline:
+    indexer = Indexer(db_path=str(tmp_path / "places.db"), chroma_path=str(tmp_path / "chroma"),
+                      summarizer=FakeSummarizer(), cache_path=str(tmp_path / "cache.db"))
+    indexer.chroma_store.embedding_function = fake_embeddings
+    return IndexingPipeline(indexer, summary_workers=2, embed_workers=1, batch_size=8,
+                            checkpoint=PipelineCheckpoint(str(tmp_path / "cache.db")))
+
+
+def test_second_run_indexes_modified_rows_and_deletes_removed_ones(tmp_path):
+    csv_path = tmp_path / "saved_place_checkpoint.csv"
+    pipeline = make_pipeline(tmp_path)
+
+    pd.DataFrame([
+        place_row("a", "Alpha", "Fresh pasta", "2025-01-01"),
+        place_row("b", "Bravo", "Wood fired pizza", "2025-01-01"),
+        place_row("c", "Charlie", "Natural wine", "2025-01-01"),
+    ]).to_csv(csv_path, index=False)
+    first = asyncio.run(pipeline.run(str(csv_path)))
+    assert sorted(first.added) == ["a", "b", "c"]
+
+    # the scraper rewrites the same file: one place changed, one re-scraped unchanged, one gone
+    pd.DataFrame([
+        place_row("a", "Alpha", "Handmade pasta and a new tasting menu", "2025-02-01"),
+        place_row("b", "Bravo", "Wood fired pizza", "2025-02-01"),
+    ]).to_csv(csv_path, index=False)
+    second = asyncio.run(pipeline.run(str(csv_path)))
+
+    assert second.updated == ["a"]
+    assert second.refreshed == ["b"]
+    assert second.deleted == ["c"]
+    assert second.added == [] and second.unchanged == [] and second.failed == []
+
+    store = pipeline.indexer.sqlite_store
+    state = store.get_index_state()
+    assert sorted(state) == ["a", "b"]
+    assert state["b"][0] == "2025-02-01"
+    description = store.conn.execute("SELECT description FROM Places WHERE id = 'a'").fetchone()[0]
+    assert description == "Handmade pasta and a new tasting menu"
+
+    collection = pipeline.indexer.chroma_store.collection
+    assert collection.get(ids=["c:description"])["ids"] == []
+    assert "Handmade pasta" in collection.get(ids=["a:description"])["documents"][0]
+
+    # a third run over the same file has nothing left to do
+    third = asyncio.run(pipeline.run(str(csv_path)))
+    assert sorted(third.unchanged) == ["a", "b"]
+    assert not (third.added or third.updated or third.refreshed or third.deleted)
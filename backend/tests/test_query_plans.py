@@ -0,0 +1,40 @@
+import os
+
+os.environ.setdefault("OPENAI_API_KEY", "test-key")
+
+from indexer import SQLiteStore  # noqa: E402
+from model import CSVPlaceData, Place, PlaceBasicData, PlaceScrapedData  # noqa: E402
+
+PRICE_LEVELS = ["$", "$$", "$$$", "$$$$", "$10-20", "$20-30", "$30-50", "$50-100", "$100+"]
+CATEGORIES = ["Italian restaurant", "Sushi restaurant", "Coffee shop", "Bar", "Cocktail bar", "Pizza restaurant"]
+
+
+def make_place(i: int) -> Place:
+    place_id = f"place-{i}"
+    place = Place(CSVPlaceData(name=place_id, url=""),
+                 PlaceBasicData(name=place_id, place_id=place_id, business_status="OPERATIONAL", formatted_address="",
+                                coordinates=(40.7 + i / 10_000, -74.0 + i / 10_000), place_types=[]),
+                 PlaceScrapedData(rating=3 + (i % 20) / 10, price_level=PRICE_LEVELS[i % len(PRICE_LEVELS)],
+                                  category=CATEGORIES[i % len(CATEGORIES)], description="", reviews=[], atmosphere=[]))
+    place.geocode_neighbourhoods = []
+    return place
+
+
+def make_store(tmp_path) -> SQLiteStore:
+    store = SQLiteStore(str(tmp_path / "places.db"))
+    store.save_many([make_place(i) for i in range(500)], source="test.csv")
+    store.checkpoint()
+    return store
+
+
+def test_hot_queries_search_an_index(tmp_path):
+    assert make_store(tmp_path).check_query_plans() == {}
+
+
+def test_index_order_scans_are_flagged(tmp_path, monkeypatch):
+    store = make_store(tmp_path)
+    monkeypatch.setattr(store, "hot_queries", lambda: {
+        "by_rating": ("SELECT p.name FROM Places p ORDER BY p.rating", []),
+        "rating_only": ("SELECT p.rating FROM Places p ORDER BY p.rating", []),
+    })
+    assert store.check_query_plans() == {"by_rating": ["SCAN p USING INDEX idx_places_rating"]}
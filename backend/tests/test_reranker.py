@@ -0,0 +1,41 @@
+import asyncio
+import threading
+
+import numpy as np
+
+from reranker import BatchingReranker
+
+
+class SlowReranker:
+    """Scores each pair by its document length, blocking until allowed to finish"""
+
+    def __init__(self):
+        self.started = threading.Event()
+        self.finish = threading.Event()
+
+    def predict(self, pairs):
+        self.started.set()
+        self.finish.wait(timeout=5)
+        return np.array([len(doc) for _, doc in pairs], dtype=np.float32)
+
+
+def test_cancelled_request_does_not_stop_the_worker():
+    model = SlowReranker()
+    reranker = BatchingReranker(model, batch_window_ms=1)
+
+    async def run():
+        # one request is being scored while a second one waits in the queue; both callers give up
+        running = asyncio.create_task(reranker.apredict([("query", "running")]))
+        await asyncio.get_running_loop().run_in_executor(None, model.started.wait, 5)
+        queued = asyncio.create_task(reranker.apredict([("query", "queued")]))
+        await asyncio.sleep(0.01)
+        running.cancel()
+        queued.cancel()
+        await asyncio.gather(running, queued, return_exceptions=True)
+        model.finish.set()
+
+        scores = await asyncio.wait_for(reranker.apredict([("query", "answered")]), timeout=5)
+        assert scores.tolist() == [len("answered")]
+
+    asyncio.run(run())
+    assert reranker._worker.is_alive()
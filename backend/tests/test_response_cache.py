@@ -0,0 +1,48 @@
+import os
+
+import numpy as np
+
+os.environ.setdefault("OPENAI_API_KEY", "test-key")
+
+from indexer import SQLiteStore  # noqa: E402
+from model import CSVPlaceData, Place, PlaceBasicData, PlaceScrapedData  # noqa: E402
+from response_cache import SemanticResponseCache  # noqa: E402
+
+EMBEDDING = np.array([1.0, 0.0, 0.0])
+
+
+def make_place(place_id: str, last_scraped: str) -> Place:
+    place = Place(CSVPlaceData(name=place_id, url=""),
+                  PlaceBasicData(name=place_id, place_id=place_id, business_status="OPERATIONAL", formatted_address="",
+                                 coordinates=(40.71, -73.95), place_types=[]),
+                  PlaceScrapedData(rating=4.5, price_level="$$", category="Coffee shop", description="", reviews=[],
+                                   atmosphere=[]))
+    place.geocode_neighbourhoods = []
+    place.last_scraped = last_scraped
+    return place
+
+
+def cache_answer(cache: SemanticResponseCache, store: SQLiteStore):
+    cache.put("coffee nearby", EMBEDDING, None, store.index_version(), {"response": "Try new"})
+    assert cache.get(EMBEDDING, None, store.index_version()) == {"response": "Try new"}
+
+
+def test_index_writes_invalidate_cached_answers(tmp_path):
+    store = SQLiteStore(str(tmp_path / "places.db"))
+    store.save_many([make_place("new", "2024-06-01"), make_place("old", "2024-01-01")])
+    cache = SemanticResponseCache()
+
+    # swapping a place for an older one keeps the row count and the latest scrape time
+    cache_answer(cache, store)
+    store.delete(["new"])
+    store.save_many([make_place("older", "2023-01-01")])
+    assert cache.get(EMBEDDING, None, store.index_version()) is None
+
+    # writes that only reach the Chroma collection
+    cache_answer(cache, store)
+    store.bump_index_version()
+    assert cache.get(EMBEDDING, None, store.index_version()) is None
+
+    cache_answer(cache, store)
+    store.backfill_normalized_columns()
+    assert cache.get(EMBEDDING, None, store.index_version()) is None
@@ -0,0 +1,84 @@
+import asyncio
+
+import pytest
+
+from rate_limiter import RateLimiter
+from scheduler import AdmissionRejected, ChatScheduler, ScheduledStreamingResponse
+
+
+def make_scheduler(**kwargs) -> ChatScheduler:
+    return ChatScheduler(RateLimiter(requests_per_minute=1_000, tokens_per_minute=1_000_000), **kwargs)
+
+
+def test_stream_releases_slot_when_client_disconnects_before_first_chunk():
+    scheduler = make_scheduler(max_concurrent=1)
+    body_started = False
+
+    async def events():
+        nonlocal body_started
+        body_started = True
+        yield "event: session\ndata: {}\n\n"
+
+    async def receive():
+        await asyncio.sleep(60)
+
+    async def send(message):
+        if message["type"] == "http.response.start":
+            raise ConnectionResetError("client went away")
+
+    async def run():
+        await scheduler.acquire("session")
+        response = ScheduledStreamingResponse(events(), scheduler, media_type="text/event-stream")
+        with pytest.raises(ConnectionResetError):
+            await response({"type": "http"}, receive, send)
+
+        assert not body_started
+        assert scheduler.stats()["running"] == 0
+        # the freed slot is immediately available to the next chat
+        await asyncio.wait_for(scheduler.acquire("session"), timeout=1)
+
+    asyncio.run(run())
+
+
+def test_cancelled_waiter_leaves_the_queue():
+    scheduler = make_scheduler(max_concurrent=1)
+
+    async def run():
+        await scheduler.acquire("a")
+        waiter = asyncio.create_task(scheduler.acquire("b"))
+        await asyncio.sleep(0)
+        assert scheduler.stats()["queued"] == 1
+
+        waiter.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await waiter
+        assert scheduler.stats()["queued"] == 0
+
+        scheduler.release()
+        assert scheduler.stats()["running"] == 0
+
+    asyncio.run(run())
+
+
+def test_sessions_take_turns_for_freed_slots():
+    scheduler = make_scheduler(max_concurrent=1, max_queue_per_session=3)
+    served = []
+
+    async def chat(session_id: str):
+        await scheduler.acquire(session_id)
+        served.append(session_id)
+
+    async def run():
+        await scheduler.acquire("busy")
+        waiters = [asyncio.create_task(chat(session_id)) for session_id in ["busy", "busy", "busy", "quiet"]]
+        await asyncio.sleep(0)
+        with pytest.raises(AdmissionRejected):
+            await scheduler.acquire("busy")
+
+        for _ in waiters:
+            scheduler.release()
+            await asyncio.sleep(0)
+        await asyncio.gather(*waiters)
+        assert served == ["busy", "quiet", "busy", "busy"]
+
+    asyncio.run(run())
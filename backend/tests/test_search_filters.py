@@ -0,0 +1,38 @@
+import os
+
+import chromadb
+import pytest
+
+os.environ.setdefault("OPENAI_API_KEY", "test-key")
+
+from indexer import build_where, place_metadata  # noqa: E402
+from model import CSVPlaceData, Place, PlaceBasicData, PlaceScrapedData  # noqa: E402
+
+
+def make_place(place_id: str, category: str) -> Place:
+    return Place(CSVPlaceData(name=place_id, url=""),
+                 PlaceBasicData(name=place_id, place_id=place_id, business_status="OPERATIONAL", formatted_address="",
+                                coordinates=None, place_types=[]),
+                 PlaceScrapedData(rating=4.5, price_level="$$", category=category, description="", reviews=[], atmosphere=[]))
+
+
+@pytest.fixture
+def collection(tmp_path):
+    places = [make_place("trattoria", "Italian restaurant"), make_place("pizzeria", "Pizza restaurant"),
+              make_place("omakase", "Sushi restaurant"), make_place("espresso", "Coffee shop")]
+    collection = chromadb.PersistentClient(path=str(tmp_path)).create_collection("places")
+    collection.add(ids=[place.place_id for place in places], embeddings=[[1.0, 0.0]] * len(places),
+                   metadatas=[place_metadata(place) for place in places])
+    return collection
+
+
+@pytest.mark.parametrize("category, expected", [
+    (["italian"], ["pizzeria", "trattoria"]),
+    (["sushi"], ["omakase"]),
+    (["japanese"], ["omakase"]),
+    (["cafe"], ["espresso"]),
+    (["Italian restaurant", "coffee shops"], ["espresso", "pizzeria", "trattoria"]),
+])
+def test_vector_category_filter_uses_the_category_taxonomy(collection, category, expected):
+    matches = collection.get(where=build_where(category=category))["ids"]
+    assert sorted(matches) == expected
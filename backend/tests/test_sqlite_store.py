@@ -0,0 +1,47 @@
+import os
+
+os.environ.setdefault("OPENAI_API_KEY", "test-key")
+
+from indexer import SQLiteStore  # noqa: E402
+from model import CSVPlaceData, Place, PlaceBasicData, PlaceScrapedData  # noqa: E402
+
+
+def geocoded(locality_id: str, name: str, full_name: str, type: str) -> dict:
+    return {"place_id": locality_id, "address_components": [{"long_name": name}], "formatted_address": full_name,
+            "geometry": {"location": {"lat": 40.71, "lng": -73.95}}, "types": [type]}
+
+
+def make_place(*neighborhoods: tuple[str, str], place_id: str = "cafe", category: str = "Coffee shop",
+               price_level: str = "$$") -> Place:
+    place = Place(CSVPlaceData(name=place_id, url=""),
+                  PlaceBasicData(name=place_id, place_id=place_id, business_status="OPERATIONAL", formatted_address="",
+                                 coordinates=(40.71, -73.95), place_types=[]),
+                  PlaceScrapedData(rating=4.5, price_level=price_level, category=category, description="", reviews=[],
+                                   atmosphere=[]))
+    place.geocode_neighbourhoods = [geocoded(locality_id, name, f"{name}, Brooklyn, NY, USA", "neighborhood")
+                                    for locality_id, name in neighborhoods]
+    place.geocode_neighbourhoods.append(geocoded("nyc", "New York", "New York, NY, USA", "locality"))
+    return place
+
+
+def test_updated_place_drops_its_old_localities(tmp_path):
+    store = SQLiteStore(str(tmp_path / "places.db"))
+    store.save_many([make_place(("wburg", "Williamsburg"))])
+    assert [place["id"] for place in store.find_places(locality_ids=["wburg"])] == ["cafe"]
+
+    store.save_many([make_place(("greenpoint", "Greenpoint"))])
+    assert store.find_places(locality_ids=["wburg"]) == []
+    assert [place["id"] for place in store.find_places(locality_ids=["greenpoint"])] == ["cafe"]
+
+
+def test_nearby_filters_like_find_places(tmp_path):
+    store = SQLiteStore(str(tmp_path / "places.db"))
+    store.save_many([make_place(place_id="diner", category="Diner", price_level="$"),
+                     make_place(place_id="trattoria", category="Italian restaurant", price_level="$$"),
+                     make_place(place_id="pizzeria", category="Pizza restaurant", price_level="$$$"),
+                     make_place(place_id="tasting", category="Italian restaurant", price_level="$100+")])
+
+    for filters in [{"category": ["italian"]}, {"price_min": 40}, {"price_max": 20}, {"category": ["italian"], "price_min": 20, "price_max": 50}]:
+        nearby = store.nearby(40.71, -73.95, radius_m=500, **filters)
+        assert sorted(place["id"] for place in nearby) == sorted(place["id"] for place in store.find_places(**filters)), filters
+    assert sorted(place["id"] for place in store.nearby(40.71, -73.95, radius_m=500, price_min=40)) == ["pizzeria", "tasting"]
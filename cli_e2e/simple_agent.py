@@ -3,6 +3,7 @@ import numpy as np
 from typing import Dict, List, Optional
 from IPython.display import Image, display
 import sqlite3
+import threading
 
 from langchain_openai import ChatOpenAI
 from langgraph.graph import StateGraph, START, END
@@ -55,6 +56,17 @@ class RestaurantSearchTools:
             toolkit=self.sql_toolkit,
             agent_type="openai-tools"
         )
+        self.db_path = db_path
+        self._local = threading.local()
+
+    def _read_conn(self) -> sqlite3.Connection:
+        # LangGraph runs sync tools on worker threads and sqlite3 connections can't cross threads,
+        # so each thread opens its own read-only connection once and reuses it
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = self._local.conn = sqlite3.connect(f"file:{self.db_path}?mode=ro", uri=True)
+            conn.execute("PRAGMA query_only=ON")
+        return conn
 
     def vector_search(self, query: str, n_results: int = 20) -> List[Dict]:
         """Search for restaurants using semantic similarity of the query. This is best for query against more qualitative
@@ -88,7 +100,7 @@ class RestaurantSearchTools:
         Gets all localities connected to the place through the join table and checks if the 
         target location is contained in any locality name or full_name."""
         try:
-            conn = sqlite3.connect('places.db')
+            conn = self._read_conn()
             cursor = conn.cursor()
 
             # Get all localities for this place through the join table
@@ -101,7 +113,6 @@ class RestaurantSearchTools:
             """, (place_id,))
 
             results = cursor.fetchall()
-            conn.close()
 
             if not results:
                 return {"error": "Restaurant not found or has no locality data"}
@@ -135,7 +146,7 @@ class RestaurantSearchTools:
     def get_restaurant_details(self, place_id: str) -> Dict:
         """Get detailed information about a specific restaurant with locality info"""
         try:
-            conn = sqlite3.connect('places.db')
+            conn = self._read_conn()
             cursor = conn.cursor()
 
             # Get restaurant details with localities
@@ -151,7 +162,6 @@ class RestaurantSearchTools:
             """, (place_id,))
 
             result = cursor.fetchone()
-            conn.close()
 
             if result:
                 return {
@@ -2,6 +2,7 @@ import json
 import numpy as np
 from typing import Dict, List
 import sqlite3
+import threading
 
 from langchain_openai import ChatOpenAI
 from langchain_core.messages import HumanMessage, SystemMessage
@@ -50,7 +51,17 @@ class RestaurantSearchTools:
             toolkit=self.sql_toolkit,
             agent_type="openai-tools"
         )
-        self.db_conn = sqlite3.connect('../places.db')
+        self.db_path = db_path
+        self._local = threading.local()
+
+    def _read_conn(self) -> sqlite3.Connection:
+        # LangGraph runs sync tools on worker threads and sqlite3 connections can't cross threads,
+        # so each thread opens its own read-only connection once and reuses it
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = self._local.conn = sqlite3.connect(f"file:{self.db_path}?mode=ro", uri=True)
+            conn.execute("PRAGMA query_only=ON")
+        return conn
 
     def vector_search(self, query: str, n_results: int = 20) -> List[Dict]:
         """Search for restaurants using semantic similarity. Best for atmosphere, vibe, and qualitative features."""
@@ -114,7 +125,7 @@ EXECUTE the query and return the actual results, not just the SQL code.
     def get_restaurant_details(self, place_id: str) -> Dict:
         """Get detailed information about a specific restaurant."""
         try:
-            cursor = self.db_conn.cursor()
+            cursor = self._read_conn().cursor()
 
             cursor.execute("""
                 SELECT p.name, p.rating, p.price_level, p.category, p.formatted_address, 
@@ -150,7 +161,7 @@ EXECUTE the query and return the actual results, not just the SQL code.
     def validate_location_match(self, place_ids: List[str], target_location: str) -> Dict:
         """Validate if a restaurant matches the target location."""
         try:
-            cursor = self.db_conn.cursor()
+            cursor = self._read_conn().cursor()
             # Build query with multiple place IDs
             place_ids_str = ','.join(['?' for _ in place_ids])
             cursor.execute(f"""